@@ -30,19 +30,28 @@
 // for id = 5 (full_screen) this must be: 1 -> only 1 is allowed for ID 5
 #define COLOR_COUNT 10 
 
-// Brightness of the LED strip (0: dimmed to 255: brightest)
-#define BRIGHTNESS 255
+// CHANNEL MUST MATCH RASPBERRY config.ini = the CHANNEL of the radio in NRF24_RADIOS that broadcasts this ID (see STRIP_RADIOS)
+// default = 90
+#define CHANNEL 90
+
+// The brightness of the LED strip is set with BRIGHTNESS in config.ini on the Raspberry, the colors arrive already scaled
 
 #define LED_PIN 6  // Digital IO pin connected to the LED strip. Don't forget to add 330 Ohm resistor
 #define LED_COUNT 10  // Number of LEDs in your LED strip, change to your needs
 const bool strip_orientation = true; // use false or true to change orientation
-const float transitionSpeed = 0.1; // transition speed between different colours (best between 0.1 - 1)
+const uint8_t transitionSpeed = 26; // transition speed between different colours in 256ths (best between 26 - 255, 26 = 0.1)
 
 unsigned long lastActivityTime = 0; // Time of last button received payload
 const unsigned long timeout = 30 * 1000; // x milliseconds timeout (turn off after duration no colors were received)
 
 // Don't change this
 #define INT_COUNT 2 + 3 * COLORS_IN_PAYLOAD  // ID + OFFSET + 3*COLORS
+#define PAYLOAD_SIZE 32  // static payload size of the nRF24L01, every payload is padded to this size
+// codec of the payload in the 3 highest bits of the id byte, set with STRIP_CODECS in config.ini (see colorcodecs.py)
+#define CODEC_RAW 0
+#define CODEC_RGB565 1
+#define CODEC_PALETTE 2
+#define CODEC_RLE 3
 
 // nRF24L01 pins: CE -> D10, CSN -> D9
 RF24 radio(10, 9);
@@ -60,7 +69,7 @@ Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_GRB + NEO_KHZ800);
 
 
 struct payload_t {
-  uint8_t data[INT_COUNT];
+  uint8_t data[PAYLOAD_SIZE];
 };
 
 struct Color {
@@ -72,7 +81,6 @@ Color currentColors[COLOR_COUNT];
 void setup() {
   strip.begin();
   strip.show();  // Turn off all pixels
-  strip.setBrightness(BRIGHTNESS);
 
   while (!Serial) {
     // Wait for serial if needed
@@ -102,7 +110,7 @@ void setup() {
 
   // Configure the radio
   radio.setDataRate(RF24_2MBPS);  // Match data rate with transmitter
-  radio.setChannel(90);          // Match channel with transmitter
+  radio.setChannel(CHANNEL);     // Match channel with transmitter
   radio.openReadingPipe(1, 0xF0F0F0F0E1);  // Match address with transmitter
   radio.setAutoAck(false);       // Disable AutoAck to broadcast payloads without waiting for confirmation
   radio.startListening();        // Start listening for packets
@@ -114,41 +122,67 @@ void setup() {
   lastActivityTime = millis(); // Update last activity time
 }
 
-Color transitionColor(Color current, Color target, float step) {
-  current.r += (target.r - current.r) * step;
-  current.g += (target.g - current.g) * step;
-  current.b += (target.b - current.b) * step;
+// current + (target - current) * step / 256 in integer math, rounded down
+Color transitionColor(Color current, Color target, uint8_t step) {
+  current.r = ((int32_t)current.r * 256 + ((int32_t)target.r - current.r) * step) >> 8;
+  current.g = ((int32_t)current.g * 256 + ((int32_t)target.g - current.g) * step) >> 8;
+  current.b = ((int32_t)current.b * 256 + ((int32_t)target.b - current.b) * step) >> 8;
   return current;
 }
 
+// Store the i-th color of the payload, taking offset into account when multiple payloads are expected for the same ID
+void setColor(int i, int offset, uint8_t r, uint8_t g, uint8_t b) {
+  if (i + offset >= COLOR_COUNT) {
+    return;
+  }
+  int index = strip_orientation ? i + offset : COLOR_COUNT - 1 - (i + offset);
+  currentColors[index] = {r, g, b};
+}
+
 void handleData(){
   payload_t payload;
   radio.read(&payload, sizeof(payload));  // Read the incoming data
 
-  int id = payload.data[0];  // First byte is the ID
+  int id = payload.data[0] & 0x1F;  // Lowest 5 bits of the first byte are the ID
+  int codec = payload.data[0] >> 5;  // Highest 3 bits of the first byte are the codec
   if (id != ID) {
     return;  // Ignore updating LED lights if ID doesn't match
   }
   lastActivityTime = millis(); // Update last activity time
 
   int offset = payload.data[1];  // Second byte is the offset
-  int rgb[INT_COUNT - 2];  // Array for RGB values
-  for (int i = 0; i < INT_COUNT - 2; i++) {
-    rgb[i] = payload.data[i + 2];
-  }
+  uint8_t *body = payload.data + 2;  // Encoded colors
 
   // Update LEDs with received colors
-  // Taking offset into account when multiple payloads are expected for the same ID (default not the case)
-  for (int i = 0; i < COLORS_IN_PAYLOAD; i++) {
-    if (i + offset >= COLOR_COUNT) {
-      continue;
+  switch (codec) {
+    case CODEC_RAW:  // 3 bytes per color: blue, green, red
+      for (int i = 0; i < COLORS_IN_PAYLOAD; i++) {
+        setColor(i, offset, body[i * 3 + 2], body[i * 3 + 1], body[i * 3]);
+      }
+      break;
+    case CODEC_RGB565:  // 2 bytes per color, little endian: 5 bits red, 6 bits green, 5 bits blue
+      for (int i = 0; i < 15; i++) {
+        uint16_t value = body[i * 2] | (uint16_t)body[i * 2 + 1] << 8;
+        uint8_t r = value >> 11, g = (value >> 5) & 0x3F, b = value & 0x1F;
+        setColor(i, offset, r << 3 | r >> 2, g << 2 | g >> 4, b << 3 | b >> 2);
+      }
+      break;
+    case CODEC_PALETTE:  // palette size, 4 palette colors (blue, green, red), then 2 bits per color index
+      for (int i = 0; i < 68; i++) {
+        int index = (body[13 + i / 4] >> (2 * (i % 4))) & 3;
+        setColor(i, offset, body[1 + index * 3 + 2], body[1 + index * 3 + 1], body[1 + index * 3]);
+      }
+      break;
+    case CODEC_RLE: {  // 7 runs of count, blue, green, red
+      int i = 0;
+      for (int run = 0; run < 7; run++) {
+        uint8_t *color = body + run * 4;
+        for (int j = 0; j < color[0]; j++) {
+          setColor(i++, offset, color[3], color[2], color[1]);
+        }
+      }
+      break;
     }
-    uint8_t b = rgb[i * 3];
-    uint8_t g = rgb[i * 3 + 1];
-    uint8_t r = rgb[i * 3 + 2];
-
-    int index = strip_orientation ? i + offset : COLOR_COUNT - 1 - (i + offset);
-    currentColors[index] = {r, g, b};
   }
 }
 
@@ -170,11 +204,11 @@ void loop() {
         // Following lines of code will spread out the smaller number of received lights (example for ID 1 default 10 colours will be broadcasted)
         // Spread out the limited amount of lights in the payload over the larger amount (or smaller) of actual LED lights on the strip
         // When spreading out over larger amount of LED lights, this smooths out the effect and looks nicer (that's why default is not larger than 10 per payload)
-        float ratio = (float)i / (LED_COUNT - 1); // Calculate the position ratio
-        float scaledIndex = ratio * (COLOR_COUNT - 1); // Map to fixed color indices
-        int indexLow = floor(scaledIndex);
-        int indexHigh = ceil(scaledIndex);
-        float blendFactor = scaledIndex - indexLow; // Distance from the lower index
+        // Position of the LED between the fixed color indices in 256ths, integer math only
+        uint32_t position = (uint32_t)i * (COLOR_COUNT - 1) * 256 / (LED_COUNT > 1 ? LED_COUNT - 1 : 1);
+        int indexLow = position >> 8;
+        uint16_t blendFactor = position & 0xFF; // Distance from the lower index
+        int indexHigh = blendFactor > 0 ? indexLow + 1 : indexLow;
 
         // Get the low and high fixed colors next to our current LED light
         Color colorLow = currentColors[indexLow];
@@ -182,9 +216,9 @@ void loop() {
 
         // Blend the two colors
         target = {
-          (1 - blendFactor) * colorLow.r + blendFactor * colorHigh.r,
-          (1 - blendFactor) * colorLow.g + blendFactor * colorHigh.g,
-          (1 - blendFactor) * colorLow.b + blendFactor * colorHigh.b
+          (uint8_t)(((uint16_t)colorLow.r * (256 - blendFactor) + (uint16_t)colorHigh.r * blendFactor) >> 8),
+          (uint8_t)(((uint16_t)colorLow.g * (256 - blendFactor) + (uint16_t)colorHigh.g * blendFactor) >> 8),
+          (uint8_t)(((uint16_t)colorLow.b * (256 - blendFactor) + (uint16_t)colorHigh.b * blendFactor) >> 8)
         };
       }
 
@@ -0,0 +1,103 @@
+# This class opens the HDMI to USB capture device (or a local video file) and reads its frames.
+# Cheap capture devices spend a lot of CPU decoding frames, so the capture is configured to only deliver what the mode needs:
+# - the pixel format: MJPG (compressed, decoded on the CPU) or YUYV (raw, no decoding but more USB bandwidth)
+# - the smallest resolution the mode needs, AVERAGE only samples a 100x100 image
+# - a buffer of 1 frame, so no stale frames queue up in the driver
+# Frames that will be dropped anyway are only grabbed and never decoded (see skip_frames and read(decode=False)).
+
+import cv2
+import numpy as np
+from metrics import metrics
+
+
+class Capture:
+    # smallest resolution (width, height) every mode needs
+    mode_resolutions = {
+        "AVERAGE": (160, 120),
+        "MINECRAFT": (1280, 720),  # the hearts are detected in a crop of the healthbar, so they need some detail
+    }
+    pixel_formats = ("MJPG", "YUYV")
+
+    def __init__(
+        self,
+        source: int | str,
+        mode: str = "",
+        pixel_format: str = "MJPG",
+        width: int = 0,
+        height: int = 0,
+        buffer_size: int = 1,
+        skip_frames: int = 0,
+    ) -> None:
+        """
+        Initialize the capture.
+
+        Args:
+            source (int | str): Index of the capture device, or the path of a video file.
+            mode (str): Mode of the moody system, used to pick the resolution when width and height are 0.
+            pixel_format (str): MJPG or YUYV, only used for capture devices.
+            width (int): Requested frame width, 0 uses the resolution of the mode.
+            height (int): Requested frame height, 0 uses the resolution of the mode.
+            buffer_size (int): Amount of frames the driver buffers, only used for capture devices.
+            skip_frames (int): Amount of frames grabbed without decoding before every frame that is read.
+        """
+        self.skip_frames = skip_frames
+        self.is_file = isinstance(source, str)
+
+        if self.is_file:
+            self.vc = cv2.VideoCapture(source)
+            return
+
+        if pixel_format not in Capture.pixel_formats:
+            raise ValueError(f"Unsupported pixel format '{pixel_format}', options are: {Capture.pixel_formats}")
+
+        self.vc = cv2.VideoCapture(source, cv2.CAP_V4L2)
+        if not self.vc.isOpened():
+            # fall back on the default backend
+            self.vc = cv2.VideoCapture(source)
+
+        # the pixel format must be set before the resolution, not every format supports every resolution
+        self.vc.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*pixel_format))
+        if width <= 0 or height <= 0:
+            width, height = Capture.mode_resolutions.get(mode, (0, 0))
+        if width > 0 and height > 0:
+            self.vc.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.vc.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.vc.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+    def read(self, decode: bool = True) -> tuple[bool, np.ndarray]:
+        """
+        Read the next frame, after skipping skip_frames frames.
+
+        Args:
+            decode (bool): False only grabs the frame without decoding it, for a frame that would be dropped anyway.
+
+        Returns:
+            tuple[bool, np.ndarray]: False if no frame could be read, and the frame (None when it was not decoded).
+        """
+        for _ in range(self.skip_frames):
+            if not self.vc.grab():
+                return False, None
+        with metrics.timer("capture"):
+            if not decode:
+                return self.vc.grab(), None
+            return self.vc.read()
+
+    def isOpened(self) -> bool:
+        return self.vc.isOpened()
+
+    def get(self, property_id: int) -> float:
+        return self.vc.get(property_id)
+
+    def file_fps(self) -> float:
+        # frame rate of a video file, 0 for capture devices which deliver their frames in real time themselves
+        return self.vc.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+
+    def describe(self) -> str:
+        fourcc = int(self.vc.get(cv2.CAP_PROP_FOURCC))
+        pixel_format = "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4))
+        width = int(self.vc.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.vc.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return f"{width}x{height} {pixel_format}"
+
+    def release(self) -> None:
+        self.vc.release()
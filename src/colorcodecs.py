@@ -0,0 +1,275 @@
+# These codecs write the colors of a chunk into the body of a payload (everything after the id and offset bytes).
+# The nRF24L01 sends payloads of at most 32 bytes, the RAW codec only fits 10 colors in them (3 bytes per color).
+# The other codecs fit more colors in a payload, so a strip needs fewer payloads every frame:
+# - RGB565: 2 bytes per color, 15 colors per payload, the lowest bits of every color value are lost.
+# - PALETTE: up to 4 colors per payload and 2 bits per LED, 68 colors per payload. Chunks with more than 4 different colors
+#   are reduced to the 4 colors that fit them best.
+# - RLE: runs of the same color as (count, blue, green, red), 7 runs and 64 colors per payload. Chunks with more than
+#   7 runs have their most similar neighbouring runs merged.
+# The codec is written in the 3 highest bits of the id byte, RAW is 0 so RAW payloads didn't change.
+# Every payload can be decoded on its own, so a lost payload never breaks the payloads after it.
+# The codecs encode in their own preallocated buffers (ufuncs with out=), so encoding a payload doesn't allocate arrays.
+# Because of these buffers every PayloadEncoder creates its own codecs.
+
+import numpy as np
+
+
+class RawCodec:
+    number = 0
+
+    def capacity(self, COLORS_IN_PAYLOAD: int) -> int:
+        return COLORS_IN_PAYLOAD
+
+    def payload_size(self, COLORS_IN_PAYLOAD: int) -> int:
+        return 2 + 3 * COLORS_IN_PAYLOAD
+
+    def encode(self, body: np.ndarray, colors: np.ndarray) -> None:
+        np.copyto(body[: colors.size], colors.reshape(-1), casting="unsafe")
+        body[colors.size :] = 0
+
+    def decode(self, body: np.ndarray, COLORS_IN_PAYLOAD: int) -> np.ndarray:
+        return body[: 3 * COLORS_IN_PAYLOAD].reshape(-1, 3)
+
+
+class Rgb565Codec:
+    number = 1
+
+    def __init__(self) -> None:
+        self.values = np.zeros(15, dtype="<u2")
+        self.channel = np.zeros(15, dtype="<u2")
+
+    def capacity(self, COLORS_IN_PAYLOAD: int) -> int:
+        return 15
+
+    def payload_size(self, COLORS_IN_PAYLOAD: int) -> int:
+        return 32
+
+    def encode(self, body: np.ndarray, colors: np.ndarray) -> None:
+        # red << 11 | green << 5 | blue of the highest bits of every color value
+        n = len(colors)
+        values, channel = self.values[:n], self.channel[:n]
+        np.right_shift(colors[:, 2], 3, out=values)
+        np.left_shift(values, 11, out=values)
+        np.right_shift(colors[:, 1], 2, out=channel)
+        np.left_shift(channel, 5, out=channel)
+        np.bitwise_or(values, channel, out=values)
+        np.right_shift(colors[:, 0], 3, out=channel)
+        np.bitwise_or(values, channel, out=values)
+        np.copyto(body[: 2 * n], values.view(np.uint8))
+        body[2 * n :] = 0
+
+    def decode(self, body: np.ndarray, COLORS_IN_PAYLOAD: int) -> np.ndarray:
+        values = body[:30].copy().view("<u2").astype(np.uint16)
+        red, green, blue = values >> 11, (values >> 5) & 0x3F, values & 0x1F
+        # repeat the highest bits in the lowest bits, so white stays 255
+        colors = np.stack([blue << 3 | blue >> 2, green << 2 | green >> 4, red << 3 | red >> 2], axis=1)
+        return colors.astype(np.uint8)
+
+
+class PaletteCodec:
+    number = 2
+    palette_size = 4
+    iterations = 4  # iterations of k-means to fit the palette when the chunk has more different colors
+
+    def __init__(self) -> None:
+        size, colors = PaletteCodec.palette_size, self.capacity(0)
+        self.keys = np.zeros(colors, dtype=np.uint32)  # every color as one number, to find the different colors
+        self.key_channel = np.zeros(colors, dtype=np.uint32)
+        self.is_new = np.zeros(colors, dtype=bool)
+        self.palette_keys = np.zeros(size, dtype=np.uint32)
+        self.values = np.zeros((colors, 3), dtype=np.float32)
+        self.palette = np.zeros((size, 3), dtype=np.float32)
+        self.differences = np.zeros((colors, size, 3), dtype=np.float32)
+        self.distances = np.zeros((colors, size), dtype=np.float32)
+        self.indices = np.zeros(colors, dtype=np.intp)
+        self.members = np.zeros((colors, size), dtype=bool)
+        self.weights = np.zeros((colors, size), dtype=np.float32)
+        self.sums = np.zeros((size, 3), dtype=np.float32)
+        self.member_counts = np.zeros(size, dtype=np.float32)
+        self.has_members = np.zeros((size, 1), dtype=bool)
+        self.numbers = np.arange(size)
+        self.encoded_palette = np.zeros((size, 3), dtype=np.uint8)
+        self.packed = np.zeros((-(-colors // 4), 4), dtype=np.uint8)  # 4 indices of 2 bits in every byte
+        self.shifted = np.zeros(-(-colors // 4), dtype=np.uint8)
+        self.spread = {}  # amount of colors -> indices of the colors the k-means starts with
+
+    def capacity(self, COLORS_IN_PAYLOAD: int) -> int:
+        return 4 * (30 - 1 - 3 * PaletteCodec.palette_size)
+
+    def payload_size(self, COLORS_IN_PAYLOAD: int) -> int:
+        return 32
+
+    def assign(self, n: int, palette: np.ndarray) -> np.ndarray:
+        # index of the nearest color of the palette for every color
+        differences, distances = self.differences[:n, : len(palette)], self.distances[:n, : len(palette)]
+        np.subtract(self.values[:n, np.newaxis, :], palette[np.newaxis, :, :], out=differences)
+        np.square(differences, out=differences)
+        np.sum(differences, axis=2, out=distances)
+        return np.argmin(distances, axis=1, out=self.indices[:n])
+
+    def fit_palette(self, colors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        n = len(colors)
+        np.copyto(self.values[:n], colors)
+
+        # the different colors, sorted like np.unique(colors, axis=0): blue << 16 | green << 8 | red
+        keys, key_channel = self.keys[:n], self.key_channel[:n]
+        np.copyto(keys, colors[:, 0])
+        np.left_shift(keys, 16, out=keys)
+        np.copyto(key_channel, colors[:, 1])
+        np.left_shift(key_channel, 8, out=key_channel)
+        np.bitwise_or(keys, key_channel, out=keys)
+        np.copyto(key_channel, colors[:, 2])
+        np.bitwise_or(keys, key_channel, out=keys)
+        keys.sort()
+        self.is_new[0] = True
+        np.not_equal(keys[1:], keys[:-1], out=self.is_new[1:n])
+        different = np.count_nonzero(self.is_new[:n])
+        if different <= PaletteCodec.palette_size:
+            palette_keys, palette = self.palette_keys[:different], self.palette[:different]
+            for channel, shift in enumerate((16, 8, 0)):
+                np.compress(self.is_new[:n], keys, out=palette_keys)
+                np.right_shift(palette_keys, shift, out=palette_keys)
+                np.bitwise_and(palette_keys, 0xFF, out=palette_keys)
+                np.copyto(palette[:, channel], palette_keys)
+            encoded_palette = self.encoded_palette[:different]
+            np.copyto(encoded_palette, palette, casting="unsafe")
+            return encoded_palette, self.assign(n, palette)
+
+        # neighbouring LEDs have similar colors, so start with colors spread over the chunk
+        spread = self.spread.get(n)
+        if spread is None:
+            spread = self.spread[n] = np.linspace(0, n - 1, PaletteCodec.palette_size).round().astype(np.intp)
+        palette = self.palette
+        np.take(self.values, spread, axis=0, out=palette)
+        members, weights = self.members[:n], self.weights[:n]
+        for _ in range(PaletteCodec.iterations + 1):
+            indices = self.assign(n, palette)
+            # the mean of the colors nearest to every color of the palette, a color without members stays where it is
+            np.equal(indices[:, np.newaxis], self.numbers, out=members)
+            np.copyto(weights, members)
+            np.matmul(weights.T, self.values[:n], out=self.sums)
+            np.sum(weights, axis=0, out=self.member_counts)
+            np.greater(self.member_counts[:, np.newaxis], 0, out=self.has_members)
+            np.divide(self.sums, self.member_counts[:, np.newaxis], out=palette, where=self.has_members)
+        np.rint(palette, out=palette)
+        np.copyto(self.encoded_palette, palette, casting="unsafe")
+        return self.encoded_palette, self.assign(n, palette)
+
+    def encode(self, body: np.ndarray, colors: np.ndarray) -> None:
+        palette, indices = self.fit_palette(colors)
+        body[:] = 0
+        body[0] = len(palette)
+        body[1 : 1 + palette.size] = palette.reshape(-1)
+
+        # 4 indices of 2 bits in every byte, the first index in the lowest bits
+        n = len(indices)
+        self.packed.fill(0)
+        np.copyto(self.packed.reshape(-1)[:n], indices, casting="unsafe")
+        packed, shifted = self.packed[: -(-n // 4)], self.shifted[: -(-n // 4)]
+        start = 1 + 3 * PaletteCodec.palette_size
+        encoded = body[start : start + len(packed)]
+        np.copyto(encoded, packed[:, 0])
+        for position in range(1, 4):
+            np.left_shift(packed[:, position], 2 * position, out=shifted)
+            np.bitwise_or(encoded, shifted, out=encoded)
+
+    def decode(self, body: np.ndarray, COLORS_IN_PAYLOAD: int) -> np.ndarray:
+        palette = body[1 : 1 + 3 * PaletteCodec.palette_size].reshape(-1, 3)
+        packed = body[1 + 3 * PaletteCodec.palette_size : 30]
+        indices = np.stack([packed & 3, packed >> 2 & 3, packed >> 4 & 3, packed >> 6 & 3], axis=1).reshape(-1)
+        return palette[indices]
+
+
+class RunLengthCodec:
+    number = 3
+    max_runs = 7
+
+    def __init__(self) -> None:
+        # buffers for the runs of a chunk, so finding and merging the runs doesn't allocate arrays for every payload
+        self.changed = np.zeros((63, 3), dtype=bool)
+        self.is_start = np.zeros(64, dtype=bool)
+        self.positions = np.arange(64)
+        self.starts = np.zeros(64, dtype=np.intp)
+        self.start_colors = np.zeros((64, 3), dtype=np.uint8)
+        # blue, green, red, count of every run and the squared distance to the next run, in one table so moving the
+        # runs after a merged run is one copy
+        self.runs = np.zeros((64, 5), dtype=np.float64)
+        self.shifted = np.zeros((64, 5), dtype=np.float64)  # the source and destination of that copy overlap
+        self.steps = np.zeros((63, 3), dtype=np.float64)
+        self.weighted = np.zeros(3, dtype=np.float64)
+
+    def capacity(self, COLORS_IN_PAYLOAD: int) -> int:
+        return 64
+
+    def payload_size(self, COLORS_IN_PAYLOAD: int) -> int:
+        return 32
+
+    def differences(self, start: int, end: int) -> None:
+        # squared distances between the runs start to end and the runs after them
+        steps = self.steps[start:end]
+        np.subtract(self.runs[start + 1 : end + 1, :3], self.runs[start:end, :3], out=steps)
+        np.square(steps, out=steps)
+        np.add.reduce(steps, axis=1, out=self.runs[start:end, 4])
+
+    def encode(self, body: np.ndarray, colors: np.ndarray) -> None:
+        # a run starts at the first color and at every color that differs from the color before it
+        length = len(colors)
+        is_start = self.is_start[:length]
+        is_start[0] = True
+        np.not_equal(colors[1:], colors[:-1], out=self.changed[: length - 1])
+        np.any(self.changed[: length - 1], axis=1, out=is_start[1:])
+        n = np.count_nonzero(is_start)
+        starts = self.starts[:n]
+        np.compress(is_start, self.positions[:length], out=starts)
+        np.take(colors, starts, axis=0, out=self.start_colors[:n])
+        runs, counts = self.runs[:, :3], self.runs[:, 3]
+        np.copyto(runs[:n], self.start_colors[:n])
+        np.subtract(starts[1:], starts[:-1], out=counts[: n - 1])
+        counts[n - 1] = length - starts[-1]
+
+        # merge the most similar neighbouring runs until they fit, the merged color is the average of both runs
+        if n > RunLengthCodec.max_runs:
+            self.differences(0, n - 1)
+        while n > RunLengthCodec.max_runs:
+            i = int(self.runs[: n - 1, 4].argmin())
+            total = counts[i] + counts[i + 1]
+            np.multiply(runs[i], counts[i], out=runs[i])
+            np.multiply(runs[i + 1], counts[i + 1], out=self.weighted)
+            np.add(runs[i], self.weighted, out=runs[i])
+            np.divide(runs[i], total, out=runs[i])
+            counts[i] = total
+
+            # move the runs after the merged run one place to the front, only the distances to the merged run changed
+            np.copyto(self.shifted[: n - i - 2], self.runs[i + 2 : n])
+            np.copyto(self.runs[i + 1 : n - 1], self.shifted[: n - i - 2])
+            n -= 1
+            self.differences(max(i - 1, 0), min(i + 1, n - 1))
+
+        body[:] = 0
+        encoded = body[: 4 * n].reshape(-1, 4)
+        np.copyto(encoded[:, 0], counts[:n], casting="unsafe")
+        np.rint(runs[:n], out=encoded[:, 1:], casting="unsafe")
+
+    def decode(self, body: np.ndarray, COLORS_IN_PAYLOAD: int) -> np.ndarray:
+        runs = body[: 4 * RunLengthCodec.max_runs].reshape(-1, 4)
+        return np.repeat(runs[:, 1:], runs[:, 0], axis=0)  # the unused runs have a count of 0
+
+
+CODECS = {"RAW": RawCodec(), "RGB565": Rgb565Codec(), "PALETTE": PaletteCodec(), "RLE": RunLengthCodec()}
+CODECS_BY_NUMBER = {codec.number: codec for codec in CODECS.values()}
+
+
+def decode_payload(payload, COLORS_IN_PAYLOAD: int) -> tuple[int, int, np.ndarray]:
+    """
+    Reference decoder of a payload, arduino_receiver.ino decodes the payloads the same way.
+
+    Args:
+        payload: Bytes-like payload as it was broadcasted.
+        COLORS_IN_PAYLOAD (int): Amount of colors in a RAW payload.
+
+    Returns:
+        tuple[int, int, np.ndarray]: The id, the offset and the (x, 3) uint8 colors, which can go past the end of the strip.
+    """
+    payload = np.frombuffer(payload, dtype=np.uint8)
+    codec = CODECS_BY_NUMBER[payload[0] >> 5]
+    return int(payload[0] & 0x1F), int(payload[1]), codec.decode(payload[2:], COLORS_IN_PAYLOAD)
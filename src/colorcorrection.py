@@ -0,0 +1,113 @@
+# This class corrects the averaged colors before they are broadcasted, so the LEDs look more like the screen.
+# The averages of a frame are often washed out: a saturation boost makes them more colorful again, the white balance
+# corrects the tint of the LED strips, the gamma corrects the brightness curve of the LEDs and the minimum brightness
+# keeps dark scenes from turning the LEDs off completely. The brightness of the LEDs is set here too, so the Arduino's
+# only show the received colors without scaling them.
+# White balance, gamma, minimum brightness and brightness are compiled into one 256 entry lookup table per color channel,
+# which is only rebuilt when the settings change. Every frame all colors are corrected with one table lookup (cv2.LUT),
+# the saturation boost is one vectorized integer blend with the gray value of every color.
+# A rebuilt table is swapped in with one assignment, so a frame that is corrected meanwhile on another thread uses
+# either the old or the new settings.
+
+import numpy as np
+import cv2
+
+
+class ColorCorrection:
+    # integer weights (sum 256) of the blue, green and red values in the gray value of a color
+    gray_weights = np.array([29, 150, 77], dtype=np.int32)
+
+    def __init__(
+        self,
+        GAMMA: float = 1.0,
+        WHITE_BALANCE: tuple = (1.0, 1.0, 1.0),
+        SATURATION: float = 1.0,
+        MIN_BRIGHTNESS: int = 0,
+        BRIGHTNESS: int = 255,
+    ) -> None:
+        """
+        Initialize the color correction.
+
+        Args:
+            GAMMA (float): Gamma of the LEDs, higher values make dark colors darker, 1 changes nothing.
+            WHITE_BALANCE (tuple): Factors of the red, green and blue values, to correct the tint of the LED strips.
+            SATURATION (float): Factor of the saturation, higher values make the colors more colorful, 1 changes nothing.
+            MIN_BRIGHTNESS (int): Lowest value (0-255) of every color value, the rest is scaled between this value and 255.
+            BRIGHTNESS (int): Brightness of the LEDs (0: off to 255: brightest), scales the corrected colors.
+        """
+        self.settings = None
+        # (lookup table, saturation factor, enabled), replaced as a whole when the settings change
+        self.tables = (None, 256, False)
+        self.configure(GAMMA, WHITE_BALANCE, SATURATION, MIN_BRIGHTNESS, BRIGHTNESS)
+
+    def configure(
+        self,
+        GAMMA: float = 1.0,
+        WHITE_BALANCE: tuple = (1.0, 1.0, 1.0),
+        SATURATION: float = 1.0,
+        MIN_BRIGHTNESS: int = 0,
+        BRIGHTNESS: int = 255,
+    ) -> bool:
+        """
+        Change the settings, the lookup table is only rebuilt when they are different from the current settings.
+
+        Returns:
+            bool: True if the lookup table was rebuilt.
+        """
+        if len(WHITE_BALANCE) != 3:
+            raise ValueError(f"WHITE_BALANCE needs a factor for red, green and blue, got: {WHITE_BALANCE}")
+        if GAMMA <= 0:
+            raise ValueError(f"GAMMA must be larger than 0, got: {GAMMA}")
+        settings = (
+            float(GAMMA),
+            tuple(float(factor) for factor in WHITE_BALANCE),
+            float(SATURATION),
+            int(MIN_BRIGHTNESS),
+            int(BRIGHTNESS),
+        )
+        if settings == self.settings:
+            return False
+        gamma, white_balance, saturation, min_brightness, brightness = settings
+
+        lut = np.zeros((256, 1, 3), dtype=np.uint8)  # blue, green and red table for cv2.LUT
+        values = np.arange(256) / 255
+        red, green, blue = white_balance
+        for channel, factor in enumerate((blue, green, red)):
+            corrected = np.clip(values * factor, 0, 1) ** gamma
+            corrected = (min_brightness + corrected * (255 - min_brightness)) * brightness / 255
+            lut[:, 0, channel] = np.clip(np.round(corrected), 0, 255)
+
+        # saturation as a fixed point factor, 256 is 1
+        saturation_factor = int(round(saturation * 256))
+        identity = np.arange(256)[:, np.newaxis]
+        enabled = saturation_factor != 256 or bool((lut[:, 0, :] != identity).any())
+
+        self.tables = (lut, saturation_factor, enabled)
+        self.settings = settings
+        return True
+
+    def apply(self, colors: np.ndarray) -> None:
+        """
+        Correct the colors in place.
+
+        Args:
+            colors (np.ndarray): (color count, 3) uint8 array of BGR colors.
+        """
+        lut, saturation_factor, enabled = self.tables
+        if not enabled:
+            return
+
+        if saturation_factor != 256:
+            # move every color away from (or towards) its gray value
+            values = colors.astype(np.int32)
+            gray = (values @ ColorCorrection.gray_weights)[:, np.newaxis] >> 8
+            values -= gray
+            values *= saturation_factor
+            values >>= 8
+            values += gray
+            np.clip(values, 0, 255, out=values)
+            np.copyto(colors, values, casting="unsafe")
+
+        # the colors as a one pixel wide image, so cv2.LUT looks up every channel in its own table
+        image = colors.reshape(-1, 1, 3)
+        cv2.LUT(image, lut, dst=image)
@@ -2,135 +2,201 @@
 # It also contains the LedStrips objects and can return, read and write their colors.
 # The horizontal_count indicates the amount of average colors to calculate for the top and bottom border of the screen.
 # The vertical_count indicates the amount of average colors to calculate for the left and right border of the screen.
+# The static_tolerance enables skipping the calculation for frames that did not change, negative disables this. Only the
+# AVERAGE colors are skipped: in MINECRAFT mode a few changed hearts are a too small change of the frame to notice.
+# The healthbar_tracker keeps track of the healthbar between frames in MINECRAFT mode.
+# The onnx_options are passed on to both YOLO models in MINECRAFT mode (threads, optimization level, ...).
+# The async_inference runs the YOLO models on a background thread in MINECRAFT mode, so calculate_colors never waits for them.
+# The defer_model_loading loads the YOLO models in the background, meanwhile the AVERAGE colors are calculated.
+# The content_area crops the black bars off the frames in AVERAGE mode, None samples the whole frame.
+# The layout describes the strips and their zones (see layout.ini), None uses the default layout with the counts above.
+# The color_correction corrects the calculated colors (brightness, gamma, white balance, ...), None leaves them as they are.
 
+import threading
+import time
 import numpy as np
 import cv2
 from ledstrip import LedStrip
-from utils import get_minecraft_health
+from sampler import ZoneSampler
+from layout import Layout
+from fingerprint import FrameFingerprint
+from healthbar import HealthbarTracker
+from contentarea import ContentArea
+from colorcorrection import ColorCorrection
+from utils import get_minecraft_health, snap_crop
+from metrics import metrics
 
 class ColorFactory:
     # only used for debugging purposes, will draw the average colors but will slow down the average FPS
     draw_squares = False
+    # the size of the hearts crop is kept or rounded up to a multiple of this, so the letterbox geometry of the hearts
+    # model is reused while the refined healthbar box changes a few pixels every frame
+    crop_step = 32
 
-    def __init__(self, horizontal_count: int, vertical_count: int, mode: str = ""):
+    def __init__(
+        self,
+        horizontal_count: int,
+        vertical_count: int,
+        mode: str = "",
+        static_tolerance: float = -1,
+        healthbar_tracker: HealthbarTracker = None,
+        onnx_options: dict = None,
+        async_inference: bool = False,
+        defer_model_loading: bool = False,
+        content_area: ContentArea = None,
+        layout: Layout = None,
+        color_correction: ColorCorrection = None,
+    ):
         self.horizontal_count = horizontal_count
         self.vertical_count = vertical_count
         self.mode = mode
-        if mode == "MINECRAFT": 
-            from yolo_onnxruntime import YOLO_ONNXRuntime_Detect       
-            from utils import get_minecraft_health 
-            self.searching_health_bar = True
-            self.healthbar_box = np.array([])
-            print("Importing YOLO models..")
-            self.yolo4healthbar = YOLO_ONNXRuntime_Detect(device_type="CPU", 
-                                   model_type="FP32", 
-                                   model_path="./yolov11_models/healthbar_480480/simplify_optimize.onnx",
-                                   class_num=1,
-                                   nms_threshold=0.5,
-                                   confidence_threshold=0.4,
-                                   inputs_shape=(480, 480)
-                                   )
-            self.yolo4hearts = YOLO_ONNXRuntime_Detect(device_type="CPU", 
-                                        model_type="FP32", 
-                                        model_path="./yolov11_models/hearts_500_320320/simplify_optimize.onnx",
-                                        class_num=3,
-                                        nms_threshold=0.5,
-                                        confidence_threshold=0.1,
-                                        inputs_shape=(320, 320))
-
-        # don't change these id's
-        self.led_strips = {
-            "left": LedStrip(1, vertical_count),
-            "top": LedStrip(2, horizontal_count),
-            "right": LedStrip(3, vertical_count),
-            "bottom": LedStrip(4, horizontal_count),
-            "full_screen": LedStrip(5, 1),
-        }
-        ids = [self.led_strips[k].id for k in self.led_strips.keys()]
-        if len(ids) != len(set(ids)):
-            raise ValueError(f"Every id of each LedStrip must be unique.")
-        elif 0 in ids:
-            raise ValueError(f"Id '0' cannot be used for initiating a LedStrip. It's reserved for the transmitter.")
-
-    def get_average_color(self, x: int, y: float, h_size: int, v_size: int, image: np.ndarray) -> np.ndarray:
-        # Define square's start and end points
-        start_point = (int(x - v_size / 2), int(y - h_size / 2))
-        end_point = (int(x + v_size / 2), int(y + h_size / 2))
-        # Ensure the region is within the image bounds
-        start_point = (max(start_point[0], 0), max(start_point[1], 0))
-        end_point = (min(end_point[0], image.shape[1]), min(end_point[1], image.shape[0]))
-
-        # Calculate the average color in this region from the original image
-        region = image[start_point[1] : end_point[1], start_point[0] : end_point[0]]
-
-        if region.size > 0:  # Avoid empty regions
-            average_color = region.mean(axis=(0, 1)).astype(int)
-        else:
-            average_color = np.zeros((1, 3))  # Fallback if region is empty
-
-        if ColorFactory.draw_squares:
-            cv2.rectangle(image, start_point, end_point, tuple(map(int, average_color)), -1)
+        self.content_area = content_area
+        self.color_correction = color_correction
+        self.last_image = None  # image returned by the last calculation, reused for unchanged frames
+        self.inference_worker = None
+        self.hearts_crop_size = None  # (height, width) of the last hearts crop, see snap_crop()
+        self.models_ready = threading.Event()
+        self.models_load_seconds = None
+        self.models_error = None  # exception of loading the models in the background, raised by calculate_colors
+        if mode == "MINECRAFT":
+            self.healthbar_tracker = healthbar_tracker if healthbar_tracker is not None else HealthbarTracker()
+            onnx_options = onnx_options if onnx_options is not None else {}
+            if defer_model_loading:
+                # Calculate AVERAGE colors until the models are loaded in the background
+                threading.Thread(
+                    target=self.load_models_in_background, args=(onnx_options, async_inference), daemon=True
+                ).start()
+            else:
+                self.load_models(onnx_options, async_inference)
 
-        # Return the average color
-        return average_color
-    
-    def average_colors(self, image: np.ndarray) -> tuple[np.ndarray, list[LedStrip]]:
-        image = cv2.resize(image, (100, 100), interpolation=cv2.INTER_AREA)
-        height, width = image.shape[:2]
+        self.layout = layout if layout is not None else Layout.default(horizontal_count, vertical_count)
 
-        square_size_horizontal = int(width / self.horizontal_count)
-        square_size_vertical = int(height / self.vertical_count)
+        # All strips are views into one contiguous frame buffer, in the same order as the zones of the sampler
+        self.frame = np.zeros((sum(strip.leds for strip in self.layout.strips), 3), dtype=np.uint8)
+        self.led_strips = {}
+        start = 0
+        for strip in self.layout.strips:
+            self.led_strips[strip.name] = LedStrip(strip.id, strip.leds, self.frame[start : start + strip.leds])
+            start += strip.leds
 
-        for index, i in enumerate(
-            np.linspace(square_size_horizontal / 2, width - square_size_horizontal / 2, self.horizontal_count)
-        ):
-            x = int(i)
+        self.sampler = ZoneSampler(self.layout)
+        # only the bands the strips average are compared, within the content area
+        self.fingerprint = None
+        if static_tolerance >= 0:
+            self.fingerprint = FrameFingerprint(static_tolerance, bands=self.sampler.strip_bounds())
 
-            c = self.get_average_color(x, square_size_horizontal / 2, int(height / 50), square_size_horizontal, image)
-            self.led_strips["top"].update_light(index, c)
+    def load_models_in_background(self, onnx_options: dict, async_inference: bool) -> None:
+        # An exception would end the thread silently and leave MINECRAFT mode in AVERAGE mode forever
+        try:
+            self.load_models(onnx_options, async_inference)
+        except Exception as e:
+            print(f"Loading the YOLO models failed: {e!r}")
+            self.models_error = e
 
-            c = self.get_average_color(
-                x, height - square_size_horizontal / 2, int(height / 50), square_size_horizontal, image
-            )
-            self.led_strips["bottom"].update_light(index, c)
+    def load_models(self, onnx_options: dict, async_inference: bool) -> None:
+        start_time = time.perf_counter()
+        from yolo_onnxruntime import YOLO_ONNXRuntime_Detect
+        print("Importing YOLO models..")
+        self.yolo4healthbar = YOLO_ONNXRuntime_Detect(device_type="CPU", 
+                               model_type="FP32", 
+                               model_path="./yolov11_models/healthbar_480480/simplify_optimize.onnx",
+                               class_num=1,
+                               nms_threshold=0.5,
+                               confidence_threshold=0.4,
+                               inputs_shape=(480, 480),
+                               **onnx_options
+                               )
+        self.yolo4hearts = YOLO_ONNXRuntime_Detect(device_type="CPU", 
+                                    model_type="FP32", 
+                                    model_path="./yolov11_models/hearts_500_320320/simplify_optimize.onnx",
+                                    class_num=3,
+                                    nms_threshold=0.5,
+                                    confidence_threshold=0.1,
+                                    inputs_shape=(320, 320),
+                                    **onnx_options)
+        if async_inference:
+            from pipeline import AsyncWorker
+            self.inference_worker = AsyncWorker(self.detect_health_color)
+        self.models_load_seconds = time.perf_counter() - start_time
+        print(f"YOLO models loaded in {self.models_load_seconds:.2f} seconds")
+        self.models_ready.set()
 
-        for index, i in enumerate(
-            np.linspace(square_size_vertical / 2, height - square_size_vertical / 2, self.vertical_count)
-        ):
-            y = int(i)
-
-            c = self.get_average_color(square_size_vertical / 2, y, square_size_vertical, int(width / 50), image)
-            self.led_strips["left"].update_light(index, c)
+    def average_colors(self, image: np.ndarray) -> tuple[np.ndarray, list[LedStrip]]:
+        # the image is already cropped to the content area by calculate_colors
+        with metrics.timer("sampling"):
+            image = cv2.resize(image, (100, 100), interpolation=cv2.INTER_AREA)
 
-            c = self.get_average_color(width - square_size_vertical / 2, y, square_size_vertical, int(width / 50), image)
-            self.led_strips["right"].update_light(index, c)
+            # the sampler writes the colors of all strips at once
+            self.sampler.sample(image, out=self.frame)
+            if self.color_correction is not None:
+                self.color_correction.apply(self.frame)
 
-        self.led_strips["full_screen"].update_light(0, image.mean(axis=(0, 1)).astype(int))
+        if ColorFactory.draw_squares:
+            self.sampler.draw(image, self.frame)
 
         return image, self.get_strips()
     
     def minecraft_health(self, image: np.ndarray) -> tuple[np.ndarray, list[LedStrip]]:
-        resized_image = cv2.resize(image, (480, 480), interpolation=cv2.INTER_AREA)
-        if self.searching_health_bar:
+        if self.inference_worker is not None:
+            # Detect on the background worker, meanwhile the last detected health color keeps being used
+            self.inference_worker.submit(image)
+            result_image = self.apply_inference_result()
+            return (image if result_image is None else result_image), self.get_strips()
+
+        image, color = self.detect_health_color(image)
+        if color is not None:
+            self.set_health_color(color)
+        return image, self.get_strips()
+
+    def set_health_color(self, color: np.ndarray) -> None:
+        # corrected once when it is set, the strips keep the color until the next detection
+        self.set_strips(color)
+        if self.color_correction is not None:
+            self.color_correction.apply(self.frame)
+
+    def apply_inference_result(self) -> np.ndarray:
+        # Sets the health color of a finished background detection, returns its image or None if no new result is ready
+        has_result, result = self.inference_worker.poll()
+        if not has_result:
+            return None
+        image, color = result
+        if color is not None:
+            self.set_health_color(color)
+        return image
+
+    def detect_health_color(self, image: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Returns the color that indicates the health, or None if the health could not be detected in this image
+        color = None
+        if not self.healthbar_tracker.is_tracking():
+            if not self.healthbar_tracker.should_search():
+                return image, color
+
+            resized_image = cv2.resize(image, (480, 480), interpolation=cv2.INTER_AREA)
             self.yolo4healthbar.pre_process(resized_image)
             self.yolo4healthbar.process()
             best_healthbar = self.yolo4healthbar.get_best_boxes(1, resized_image)
             if best_healthbar.shape[0] == 1:
-                self.searching_health_bar = False
-                self.healthbar_box = best_healthbar
+                self.healthbar_tracker.found(best_healthbar[0])
                 '''x,y,x2,y2 = map(int,best_healthbar[0][:4])
                 cv2.rectangle(resized_image, (x,y), (x2,y2), (255,0,0), 1)'''
+            else:
+                self.healthbar_tracker.not_found()
 
         else:
-            x1, y1, x2, y2 = map(int, self.healthbar_box[0][:4])
+            x1, y1, x2, y2 = map(int, self.healthbar_tracker.box)
             old_h, old_w, _ = image.shape
-            new_h, new_w, _ = resized_image.shape
+            new_h, new_w = 480, 480  # size of the image the healthbar was detected in
             x_factor = old_w/new_w
             y_factor = old_h/new_h
             x1, y1, x2, y2 = map(int, [x1*x_factor,y1*y_factor,x2*x_factor,y2*y_factor])
             half_width = int((x2 - x1)/2)
             #cv2.rectangle(image, (int(x1*x_factor),int(y1*y_factor)), (int(x2*x_factor),int(y2*y_factor)), (255,0,0), 1)
-            image = image[y2-half_width*2-10:y2+10, x1-10:x2+10]
+            top, left = max(y2-half_width*2-10, 0), max(x1-10, 0)
+            top, left, bottom, right = snap_crop(
+                top, left, y2+10, x2+10, self.crop_bounds(image), ColorFactory.crop_step, self.hearts_crop_size
+            )
+            self.hearts_crop_size = (bottom - top, right - left)
+            image = image[top:bottom, left:right]
             self.yolo4hearts.pre_process(image)
             self.yolo4hearts.process()
             best_hearts = self.yolo4hearts.get_best_boxes(10, image)
@@ -139,7 +205,15 @@ class ColorFactory:
                 red = int(255 * (1 - health / 10))
                 green = int(255 * (health / 10))
                 color = np.array([0, green, red], dtype=np.uint8)
-                self.set_strips(color)
+
+                # Refine the healthbar box with the box around all hearts, converted back to the resized image
+                hearts_box = np.array([
+                    (best_hearts[:, 0].min() + left) / x_factor,
+                    (best_hearts[:, 1].min() + top) / y_factor,
+                    (best_hearts[:, 2].max() + left) / x_factor,
+                    (best_hearts[:, 3].max() + top) / y_factor,
+                ])
+                self.healthbar_tracker.hit(hearts_box)
                 '''for heart in best_hearts:
                     x,y,x2,y2 = map(int,heart[:4])
                     detected_class = int(heart[5])
@@ -156,33 +230,50 @@ class ColorFactory:
                             # Default case if none of the above match
                     cv2.rectangle(image, (x,y), (x2,y2), tuple(map(int,color)), 1)'''
 
-            else:
+            elif self.healthbar_tracker.miss():
                 print("Search new healthbar")
-                self.searching_health_bar = True
-                self.healthbar_box = np.array([])
         
-        return image, self.get_strips()
+        return image, color
 
 
+    def crop_bounds(self, image: np.ndarray) -> tuple[int, int, int, int]:
+        # top, left, bottom, right of the content of the image, without the black bars detected in it (if any)
+        height, width = image.shape[:2]
+        if self.content_area is None or self.content_area.shape != image.shape:
+            return 0, 0, height, width
+        bar_height, bar_width = self.content_area.bars
+        return bar_height, bar_width, height - bar_height, width - bar_width
+
     def calculate_colors(self, image: np.ndarray) -> tuple[np.ndarray, list[LedStrip]]:
-        match self.mode:
+        mode = self.mode
+        if mode == "MINECRAFT" and self.models_error is not None:
+            raise RuntimeError("The YOLO models could not be loaded in the background") from self.models_error
+        if mode == "MINECRAFT" and not self.models_ready.is_set():
+            mode = "AVERAGE"
+
+        if mode == "AVERAGE":
+            if self.content_area is not None:
+                # only resize and sample the content, not the black bars around it
+                image = self.content_area.crop(image)
+            # Reuse the colors of the previous frame when nothing changed (paused video, menus, ...)
+            if self.fingerprint is not None and self.fingerprint.is_static(image) and self.last_image is not None:
+                metrics.increment("static_frames")
+                return self.last_image, self.get_strips()
+
+        match mode:
             case "MINECRAFT":
-                return self.minecraft_health(image)
+                image, _ = self.minecraft_health(image)
             case "AVERAGE":
-                return self.average_colors(image)
+                image, _ = self.average_colors(image)
             case _:
                 print("No correct mode was set in config.ini!")
-        
+
+        self.last_image = image
         return image, self.get_strips()
 
     def get_strips(self) -> list[LedStrip]:
-        return [
-            self.led_strips["left"],
-            self.led_strips["right"],
-            self.led_strips["top"],
-            self.led_strips["bottom"],
-            self.led_strips["full_screen"],
-        ]
+        # in the order of the layout
+        return list(self.led_strips.values())
 
     def test_strips(self) -> list[LedStrip]:
         for strip in self.get_strips():
@@ -193,3 +284,7 @@ class ColorFactory:
         for strip in self.get_strips():
             strip.set_lights(color)
         return self.get_strips()
+
+    def close(self) -> None:
+        if self.inference_worker is not None:
+            self.inference_worker.stop()
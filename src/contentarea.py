@@ -0,0 +1,109 @@
+# This class finds the part of the screen with content, without the black bars of letterboxed (21:9) or pillarboxed (4:3) video.
+# The border strips would average the black bars and go dark, so the AVERAGE mode only samples the content area.
+# The detection only runs every DETECT_INTERVAL frames on a small copy of the frame, in between the area is cached.
+# Every frame a few pixels in the middle of the cropped bars are checked, when they stay lit for a few frames (the scene
+# changed, the video ended, a menu opened) the area is detected again right away. This early detection happens at most
+# once per DETECT_INTERVAL frames, so subtitles or logos in the bars don't make it run every frame.
+# The bars on both sides must be equally large (within bar_tolerance pixels of the small copy), so a dark part of a scene
+# (like a dark HUD at the bottom) is not cropped away, and both sides are cropped by the smallest of both bars.
+
+import cv2
+import numpy as np
+
+
+class ContentArea:
+    detect_size = 90  # the frame is reduced to detect_size x detect_size pixels to detect the bars
+    check_step = 8  # every check_step-th pixel of the middle of a bar is checked every frame
+    lit_frames = 3  # amount of frames in a row the bars must be lit to detect the area before the interval is over
+    bar_tolerance = 2  # largest difference in pixels (of detect_size) between the bars on both sides
+
+    def __init__(self, DETECT_INTERVAL: int = 30, BLACK_THRESHOLD: int = 20, MIN_CONTENT: float = 0.5) -> None:
+        """
+        Initialize the content area detector.
+
+        Args:
+            DETECT_INTERVAL (int): Amount of frames between two detections.
+            BLACK_THRESHOLD (int): Pixels with all color values up to this threshold count as black.
+            MIN_CONTENT (float): Minimum part (0 - 1) of the height and width that is kept, larger bars are ignored.
+        """
+        self.DETECT_INTERVAL = DETECT_INTERVAL
+        self.BLACK_THRESHOLD = BLACK_THRESHOLD
+        self.MIN_CONTENT = MIN_CONTENT
+        self.frames_until_detect = 0
+        self.frames_lit = 0  # amount of frames in a row the cropped bars were lit
+        self.early_detect_allowed = True  # False after an early detection, until the next detection of the interval
+        self.shape = None  # shape of the frames the area was detected in
+        self.bars = (0, 0)  # height of the top and bottom bars, width of the left and right bars in pixels
+
+    def detect(self, image: np.ndarray) -> None:
+        height, width = image.shape[:2]
+        small = cv2.resize(image, (ContentArea.detect_size, ContentArea.detect_size), interpolation=cv2.INTER_AREA)
+        content = small.max(axis=2) > self.BLACK_THRESHOLD
+        rows = np.flatnonzero(content.any(axis=1))
+        columns = np.flatnonzero(content.any(axis=0))
+        self.shape = image.shape
+        if len(rows) == 0:
+            # a black frame has no bars to detect, keep the area of the previous frames
+            return
+
+        # the smallest bar of both sides, so the crop is always centered, bars of different sizes are dark content
+        bar_rows = self.symmetric_bar(rows[0], ContentArea.detect_size - 1 - rows[-1])
+        bar_columns = self.symmetric_bar(columns[0], ContentArea.detect_size - 1 - columns[-1])
+        bar_height = bar_rows * height // ContentArea.detect_size
+        bar_width = bar_columns * width // ContentArea.detect_size
+        if height - 2 * bar_height < self.MIN_CONTENT * height:
+            bar_height = 0
+        if width - 2 * bar_width < self.MIN_CONTENT * width:
+            bar_width = 0
+        self.bars = (bar_height, bar_width)
+
+    @staticmethod
+    def symmetric_bar(first: int, last: int) -> int:
+        if abs(first - last) > ContentArea.bar_tolerance:
+            return 0
+        return min(first, last)
+
+    def bars_lit(self, image: np.ndarray) -> bool:
+        # checks a sparse line in the middle of every cropped bar for content
+        bar_height, bar_width = self.bars
+        height, width = image.shape[:2]
+        step = ContentArea.check_step
+        if bar_height > 0:
+            if image[bar_height // 2, ::step].max() > self.BLACK_THRESHOLD:
+                return True
+            if image[height - 1 - bar_height // 2, ::step].max() > self.BLACK_THRESHOLD:
+                return True
+        if bar_width > 0:
+            if image[::step, bar_width // 2].max() > self.BLACK_THRESHOLD:
+                return True
+            if image[::step, width - 1 - bar_width // 2].max() > self.BLACK_THRESHOLD:
+                return True
+        return False
+
+    def crop(self, image: np.ndarray) -> np.ndarray:
+        """
+        Crop the frame to the content area, the crop is a view so no pixels are copied.
+
+        Args:
+            image (np.ndarray): Full frame.
+
+        Returns:
+            np.ndarray: The content area of the frame.
+        """
+        self.frames_until_detect -= 1
+        if self.frames_until_detect <= 0 or image.shape != self.shape:
+            self.detect(image)
+            self.frames_until_detect = self.DETECT_INTERVAL
+            self.frames_lit = 0
+            self.early_detect_allowed = True
+        elif self.early_detect_allowed:
+            self.frames_lit = self.frames_lit + 1 if self.bars_lit(image) else 0
+            if self.frames_lit >= ContentArea.lit_frames:
+                self.detect(image)
+                self.frames_until_detect = self.DETECT_INTERVAL
+                self.frames_lit = 0
+                self.early_detect_allowed = False
+
+        bar_height, bar_width = self.bars
+        height, width = image.shape[:2]
+        return image[bar_height : height - bar_height, bar_width : width - bar_width]
@@ -0,0 +1,83 @@
+# This class spreads the strips over multiple transmitters, every transmitter has its own nRF24L01 and channel.
+# One radio on one 2MBPS channel can only send a limited amount of payloads per second, so large installations assign
+# their strips to several radios (each with its own CE pin and CSN pin or SPI bus) on different channels.
+# Every transmitter sends on its own thread, so the radios broadcast in parallel instead of one after the other.
+# It is a drop-in replacement of a Transmitter: update_receivers(), repeat() and close().
+
+import threading
+from ledstrip import LedStrip
+from pipeline import LatestValue
+from transmitter import Transmitter
+
+
+class FanOut:
+    def __init__(self, transmitters: list[Transmitter], strip_radios: dict = None) -> None:
+        """
+        Initialize the fan-out and start a thread for every transmitter.
+
+        Args:
+            transmitters (list[Transmitter]): Transmitters with their own radio.
+            strip_radios (dict): Id of the LedStrip -> index of the transmitter that sends it, 0 for strips that are not in it.
+        """
+        self.transmitters = transmitters
+        self.strip_radios = strip_radios if strip_radios is not None else {}
+        self.slots = [LatestValue() for _ in transmitters]
+        self.locks = [threading.Lock() for _ in transmitters]  # a transmitter is used by one thread at a time
+        self.stopped = threading.Event()
+        self.threads = [
+            threading.Thread(target=self.transmit_loop, args=(index,), daemon=True) for index in range(len(transmitters))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def partition(self, led_strips: list[LedStrip]) -> list[list[LedStrip]]:
+        partitions = [[] for _ in self.transmitters]
+        for strip in led_strips:
+            partitions[self.strip_radios.get(strip.id, 0)].append(strip)
+        return partitions
+
+    def transmit_loop(self, index: int) -> None:
+        # the thread sends copies of the strips, so the main loop can already write the colors of the next frame
+        mirror_strips = []
+        while not self.stopped.is_set():
+            has_value, strips = self.slots[index].get(timeout=0.1)
+            if not has_value:
+                continue
+            if [strip.id for strip in mirror_strips] != [id for id, _ in strips]:
+                mirror_strips = [LedStrip(id, len(colors)) for id, colors in strips]
+            for strip, (_, colors) in zip(mirror_strips, strips):
+                strip.colors[:] = colors
+            with self.locks[index]:
+                self.transmitters[index].update_receivers(mirror_strips)
+
+    def update_receivers(self, led_strips: list[LedStrip]) -> None:
+        for slot, strips in zip(self.slots, self.partition(led_strips)):
+            if strips:
+                slot.put([(strip.id, strip.colors.copy()) for strip in strips])
+
+    def repeat(self, led_strips: list[LedStrip], seconds: float) -> None:
+        # every radio repeats its own strips at the same time
+        def repeat_strips(index: int, strips: list[LedStrip]) -> None:
+            with self.locks[index]:
+                self.transmitters[index].repeat(strips, seconds)
+
+        threads = [
+            threading.Thread(target=repeat_strips, args=(index, strips))
+            for index, strips in enumerate(self.partition(led_strips))
+            if strips
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def dropped_updates(self) -> int:
+        # amount of updates a radio skipped because the next one was already there
+        return sum(slot.dropped for slot in self.slots)
+
+    def close(self) -> None:
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        for transmitter in self.transmitters:
+            transmitter.close()
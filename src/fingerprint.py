@@ -0,0 +1,84 @@
+# This class detects frames that did not change, for example when a video is paused or a menu is shown.
+# Only the bands of the frame the strips average are compared: every band is reduced to a tiny thumbnail with INTER_AREA,
+# so a small change in a border zone is not skipped by sampling a grid of pixels. Large bands (like the full screen) are
+# read with a step, every thumbnail pixel still averages samples x samples pixels of the band, which keeps the check
+# far cheaper than the resize of the color calculation.
+# The thumbnails are compared with the thumbnails of the last frame of which the colors were calculated, band by band,
+# so a change in a thin border band is not averaged away by the rest of the frame.
+
+import numpy as np
+import cv2
+
+
+class FrameFingerprint:
+    samples = 8  # amount of pixels along each side of a band that are averaged into every pixel of its thumbnail
+
+    def __init__(self, tolerance: float, size: int = 16, bands: list[tuple] = None) -> None:
+        """
+        Initialize the frame fingerprint.
+
+        Args:
+            tolerance (float): Largest mean difference (0-255) per pixel value in a band for a frame to count as unchanged.
+            size (int): Length of the longest side of the thumbnail of every band.
+            bands (list[tuple]): x1, y1, x2, y2 (parts 0 - 1 of the frame) of every band to compare, None compares the whole frame.
+        """
+        self.tolerance = tolerance
+        self.bands = bands if bands is not None else [(0, 0, 1, 1)]
+
+        # the thumbnails of all bands are views into one buffer, so the reference is one copy of it
+        sizes = []
+        for x1, y1, x2, y2 in self.bands:
+            longest = max(x2 - x1, y2 - y1)
+            sizes.append((max(1, round(size * (y2 - y1) / longest)), max(1, round(size * (x2 - x1) / longest))))
+        self.buffer = np.zeros(sum(height * width * 3 for height, width in sizes), dtype=np.uint8)
+        self.reference = np.zeros_like(self.buffer)  # buffer of the last frame that was calculated
+        self.has_reference = False
+        self.thumbnails = []
+        self.references = []
+        start = 0
+        for height, width in sizes:
+            end = start + height * width * 3
+            self.thumbnails.append(self.buffer[start:end].reshape(height, width, 3))
+            self.references.append(self.reference[start:end].reshape(height, width, 3))
+            start = end
+        self.shape = None  # shape of the frames the regions are calculated for
+        self.regions = []  # (rows, columns) slices of every band
+
+    def compile(self, shape: tuple) -> None:
+        height, width = shape[:2]
+        self.regions = []
+        for (x1, y1, x2, y2), thumbnail in zip(self.bands, self.thumbnails):
+            top, left = min(int(y1 * height), height - 1), min(int(x1 * width), width - 1)
+            bottom, right = max(int(np.ceil(y2 * height)), top + 1), max(int(np.ceil(x2 * width)), left + 1)
+            row_step = max(1, (bottom - top) // (thumbnail.shape[0] * FrameFingerprint.samples))
+            column_step = max(1, (right - left) // (thumbnail.shape[1] * FrameFingerprint.samples))
+            self.regions.append((slice(top, bottom, row_step), slice(left, right, column_step)))
+        self.shape = shape
+        self.has_reference = False
+
+    def is_static(self, image: np.ndarray) -> bool:
+        """
+        Check if the bands of the image are the same as those of the last calculated image within the tolerance.
+        When they're not, the image becomes the new reference.
+
+        Args:
+            image (np.ndarray): BGR frame.
+
+        Returns:
+            bool: True if the colors of the previous frame can be reused.
+        """
+        if image.shape != self.shape:
+            self.compile(image.shape)
+
+        for thumbnail, (rows, columns) in zip(self.thumbnails, self.regions):
+            cv2.resize(image[rows, columns], thumbnail.shape[1::-1], dst=thumbnail, interpolation=cv2.INTER_AREA)
+
+        if self.has_reference and all(
+            cv2.norm(thumbnail, reference, cv2.NORM_L1) / thumbnail.size <= self.tolerance
+            for thumbnail, reference in zip(self.thumbnails, self.references)
+        ):
+            return True
+
+        np.copyto(self.reference, self.buffer)
+        self.has_reference = True
+        return False
@@ -0,0 +1,39 @@
+# This class paces the main loop to a target frame rate.
+# Instead of sleeping a fixed amount of time every frame, it only sleeps for what is left of the frame budget.
+# Frames that take longer than the budget are counted as overruns and the next deadline is reset to avoid catching up.
+
+import time
+
+
+class FramePacer:
+    def __init__(self, target_fps: float) -> None:
+        """
+        Initialize the frame pacer.
+
+        Args:
+            target_fps (float): Frame rate to pace to, 0 or lower disables pacing (run as fast as possible).
+        """
+        self.target_fps = target_fps
+        self.frame_time = 1 / target_fps if target_fps > 0 else 0
+        self.deadline = time.monotonic() + self.frame_time
+        self.overruns = 0  # amount of frames that took longer than the frame budget
+
+    def wait(self) -> None:
+        """
+        Sleep until the deadline of the current frame and set the deadline of the next frame.
+        """
+        if self.frame_time == 0:
+            return
+
+        remaining = self.deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+            self.deadline += self.frame_time
+        else:
+            self.overruns += 1
+            self.deadline = time.monotonic() + self.frame_time
+
+    def reset_overruns(self) -> int:
+        overruns = self.overruns
+        self.overruns = 0
+        return overruns
@@ -0,0 +1,72 @@
+# This class keeps track of the Minecraft healthbar between frames, so the expensive healthbar detection only runs when the lock is lost.
+# The box of the healthbar is refined a little bit every frame with the position of the detected hearts.
+# A few frames without hearts are tolerated before searching for the healthbar again (the hearts can blink or be covered).
+# While no healthbar is found (menus, loading screens, ...), the search runs less and less often.
+
+import numpy as np
+
+
+class HealthbarTracker:
+    def __init__(self, MAX_MISSES: int = 3, MAX_SEARCH_INTERVAL: int = 30, REFINE_RATE: float = 0.2) -> None:
+        """
+        Initialize the healthbar tracker.
+
+        Args:
+            MAX_MISSES (int): Amount of consecutive frames without hearts that are tolerated before searching again.
+            MAX_SEARCH_INTERVAL (int): Largest amount of frames between two searches when no healthbar is found.
+            REFINE_RATE (float): Weight (0-1) of the detected hearts when refining the healthbar box.
+        """
+        self.MAX_MISSES = MAX_MISSES
+        self.MAX_SEARCH_INTERVAL = MAX_SEARCH_INTERVAL
+        self.REFINE_RATE = REFINE_RATE
+
+        self.box = None  # x1, y1, x2, y2 of the tracked healthbar, None while searching
+        self.misses = 0
+        self.search_interval = 1
+        self.frames_until_search = 0
+
+    def is_tracking(self) -> bool:
+        return self.box is not None
+
+    def should_search(self) -> bool:
+        # Skips frames between searches, the interval grows while no healthbar is found
+        if self.frames_until_search > 0:
+            self.frames_until_search -= 1
+            return False
+        return True
+
+    def found(self, box: np.ndarray) -> None:
+        self.box = np.array(box[:4], dtype=float)
+        self.misses = 0
+        self.search_interval = 1
+        self.frames_until_search = 0
+
+    def not_found(self) -> None:
+        self.frames_until_search = self.search_interval - 1
+        self.search_interval = min(self.search_interval * 2, self.MAX_SEARCH_INTERVAL)
+
+    def hit(self, hearts_box: np.ndarray) -> None:
+        """
+        Move the healthbar box a bit towards the box around all detected hearts.
+
+        Args:
+            hearts_box (np.ndarray): x1, y1, x2, y2 around all hearts, in the same coordinates as the healthbar box.
+        """
+        self.box += self.REFINE_RATE * (hearts_box - self.box)
+        self.misses = 0
+
+    def miss(self) -> bool:
+        """
+        Register a frame in which the hearts were not detected.
+
+        Returns:
+            bool: True if too many frames were missed and the healthbar is lost.
+        """
+        self.misses += 1
+        if self.misses <= self.MAX_MISSES:
+            return False
+        self.box = None
+        self.misses = 0
+        self.search_interval = 1
+        self.frames_until_search = 0
+        return True
@@ -0,0 +1,123 @@
+# This class broadcasts the colors at a fixed rate, independent of how often new colors are calculated.
+# It keeps the two last calculated frames and sends frames that fade from the previous to the latest colors in the time
+# between the two calculations, so slow calculations (like MINECRAFT mode on a slow board) don't make the LEDs step.
+# The fade only uses integer math on preallocated buffers: previous + (latest - previous) * weight >> 7.
+# The fade ends when the next frame is expected, so the LEDs show the calculated colors one calculation later.
+# Only frames with other colors start a new fade, the main loop also hands over reused colors (static frames, a background
+# detection that is not finished yet), so the fade lasts as long as it took to calculate colors that changed.
+# It is a drop-in replacement of a Transmitter for the main loop: update_receivers() hands over a new calculated frame.
+
+import threading
+import time
+import numpy as np
+from framepacer import FramePacer
+from ledstrip import LedStrip
+
+
+class Interpolator:
+    weight_bits = 7  # (latest - previous) * weight must fit in an int16, so the weight goes from 0 to 128
+    max_interval = 1.0  # longest fade in seconds, for colors that change after they stayed the same for a while
+
+    def __init__(self, transmitter, OUTPUT_FPS: float) -> None:
+        """
+        Initialize the interpolator.
+
+        Args:
+            transmitter: Transmitter (or FanOut) to broadcast the interpolated frames with.
+            OUTPUT_FPS (float): Amount of interpolated frames to broadcast per second.
+        """
+        self.transmitter = transmitter
+        self.OUTPUT_FPS = OUTPUT_FPS
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.output_loop, daemon=True)
+
+        # allocated at the first frame, when the layout of the strips is known
+        self.layout = None  # (id, led_count) of every strip
+        self.previous = None  # int16 colors the fade starts from
+        self.latest = None  # int16 colors the fade ends with
+        self.incoming = None  # int16 colors of the last handed over frame
+        self.difference = None  # int16 latest - previous
+        self.blend = None  # int16 scratch buffer
+        self.output = None  # uint8 colors of the output strips
+        self.output_strips = []  # LedStrips that are views into the output buffer
+
+        self.latest_time = 0.0  # time.perf_counter() of the latest frame with other colors
+        self.interval = 1 / OUTPUT_FPS  # seconds between the two last frames with other colors, the duration of the fade
+        self.update_time = 0.0  # time.perf_counter() of the last handed over frame
+        self.update_interval = 1 / OUTPUT_FPS  # seconds between the two last handed over frames
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def allocate(self, led_strips: list[LedStrip]) -> None:
+        self.layout = [(strip.id, strip.led_count) for strip in led_strips]
+        total = sum(strip.led_count for strip in led_strips)
+        self.previous = np.zeros((total, 3), dtype=np.int16)
+        self.latest = np.zeros((total, 3), dtype=np.int16)
+        self.incoming = np.zeros((total, 3), dtype=np.int16)
+        self.difference = np.zeros((total, 3), dtype=np.int16)
+        self.blend = np.zeros((total, 3), dtype=np.int16)
+        self.output = np.zeros((total, 3), dtype=np.uint8)
+        self.output_strips = []
+        start = 0
+        for strip in led_strips:
+            self.output_strips.append(LedStrip(strip.id, strip.led_count, self.output[start : start + strip.led_count]))
+            start += strip.led_count
+
+    def update_receivers(self, led_strips: list[LedStrip]) -> None:
+        # hands a new calculated frame over, the fade to it starts from the colors that are broadcasted right now
+        now = time.perf_counter()
+        with self.lock:
+            if self.layout != [(strip.id, strip.led_count) for strip in led_strips]:
+                self.allocate(led_strips)
+                self.latest_time = now
+                self.update_time = now
+            self.update_interval = max(now - self.update_time, 1 / self.OUTPUT_FPS)
+            self.update_time = now
+
+            start = 0
+            for strip in led_strips:
+                np.copyto(self.incoming[start : start + strip.led_count], strip.colors)
+                start += strip.led_count
+            if np.array_equal(self.incoming, self.latest):
+                # reused colors, the running fade goes on
+                return
+
+            np.copyto(self.previous, self.output)
+            self.latest, self.incoming = self.incoming, self.latest
+            np.subtract(self.latest, self.previous, out=self.difference)
+            self.interval = min(max(now - self.latest_time, 1 / self.OUTPUT_FPS), Interpolator.max_interval)
+            self.latest_time = now
+
+    def interpolate(self, now: float) -> bool:
+        """
+        Write the faded colors of this moment into the output strips.
+
+        Returns:
+            bool: False if no frame was handed over for a while (idle, stopped), then nothing should be broadcasted.
+        """
+        if self.layout is None:
+            return False
+        if now - self.update_time > max(2 * self.update_interval, 0.5):
+            return False
+        elapsed = now - self.latest_time
+        weight = min(int(elapsed / self.interval * (1 << Interpolator.weight_bits)), 1 << Interpolator.weight_bits)
+        np.multiply(self.difference, weight, out=self.blend)
+        np.right_shift(self.blend, Interpolator.weight_bits, out=self.blend)
+        np.add(self.blend, self.previous, out=self.blend)
+        np.copyto(self.output, self.blend, casting="unsafe")
+        return True
+
+    def output_loop(self) -> None:
+        pacer = FramePacer(self.OUTPUT_FPS)
+        while not self.stopped.is_set():
+            with self.lock:
+                has_output = self.interpolate(time.perf_counter())
+            if has_output:
+                self.transmitter.update_receivers(self.output_strips)
+            pacer.wait()
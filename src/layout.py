@@ -0,0 +1,129 @@
+# This class describes which zones of the screen every strip shows, read from a layout file (see layout.ini).
+# Every strip has an id, an amount of LEDs (zones) and a border of the screen it runs along, in a direction and with a depth.
+# Partial borders (start, end), free zones like corners (rect) and multiple TVs in one frame (screen) can be described too.
+# The ZoneSampler compiles the layout once per image size into the rectangles of all zones, in the order of the strips.
+# Without a layout file the default layout is used: left, right, top and bottom strips and one full_screen zone.
+
+import configparser
+
+
+class StripLayout:
+    borders = ("left", "top", "right", "bottom", "full", "rect")
+
+    def __init__(
+        self,
+        name: str,
+        id: int,
+        border: str,
+        leds: int,
+        direction: str = "forward",
+        depth: float = 0.02,
+        inset: float = -1,
+        start: float = 0,
+        end: float = 1,
+        rect: tuple = (0, 0, 1, 1),
+        screen: tuple = (0, 0, 1, 1),
+    ) -> None:
+        """
+        Initialize the layout of a strip, all positions and sizes are parts (0 - 1) of the screen.
+
+        Args:
+            name (str): Name of the strip, used in config.ini (STRIP_WEIGHTS, STRIP_CODECS, STRIP_RADIOS).
+            id (int): Id of the Arduino's that show this strip.
+            border (str): left, top, right or bottom to run along that border, full for the whole screen, rect for a free zone.
+            leds (int): Amount of zones (colors) of the strip.
+            direction (str): forward (left to right, top to bottom) or reverse.
+            depth (float): Thickness of the zones, measured from the border into the screen.
+            inset (float): Distance of the middle of the zones from the border, negative uses half the length of a zone.
+            start (float): Where the strip starts along the border.
+            end (float): Where the strip ends along the border.
+            rect (tuple): x1, y1, x2, y2 of a rect strip, split into zones along its longest side.
+            screen (tuple): x1, y1, x2, y2 of the screen in the frame, for multiple TVs in one frame.
+        """
+        if border not in StripLayout.borders:
+            raise ValueError(f"Unknown border '{border}' of strip '{name}', options are: {StripLayout.borders}")
+        if direction not in ("forward", "reverse"):
+            raise ValueError(f"Unknown direction '{direction}' of strip '{name}', options are: forward, reverse")
+        if leds < 1:
+            raise ValueError(f"Strip '{name}' needs at least 1 LED.")
+        self.name = name
+        self.id = id
+        self.border = border
+        self.leds = leds
+        self.direction = direction
+        self.depth = depth
+        self.inset = inset
+        self.start = start
+        self.end = end
+        self.rect = rect
+        self.screen = screen
+
+
+class Layout:
+    def __init__(self, strips: list[StripLayout]) -> None:
+        ids = [strip.id for strip in strips]
+        if len(ids) != len(set(ids)):
+            raise ValueError(f"Every id of each LedStrip must be unique.")
+        elif 0 in ids:
+            raise ValueError(f"Id '0' cannot be used for initiating a LedStrip. It's reserved for the transmitter.")
+        for strip in strips:
+            # the highest 3 bits of the id byte of a payload are the codec (see colorcodecs.py)
+            if not 0 < strip.id < 32:
+                raise ValueError(f"Id '{strip.id}' of strip '{strip.name}' must be between 1 and 31.")
+        self.strips = strips
+
+    @staticmethod
+    def default(horizontal_count: int, vertical_count: int) -> "Layout":
+        # don't change these id's, they are set on the Arduino's
+        return Layout(
+            [
+                StripLayout("left", 1, "left", vertical_count),
+                StripLayout("right", 3, "right", vertical_count),
+                StripLayout("top", 2, "top", horizontal_count),
+                StripLayout("bottom", 4, "bottom", horizontal_count),
+                StripLayout("full_screen", 5, "full", 1),
+            ]
+        )
+
+    @staticmethod
+    def from_file(path: str, horizontal_count: int, vertical_count: int) -> "Layout":
+        """
+        Read a layout file, every section is a strip (see layout.ini).
+
+        Args:
+            path (str): Path of the layout file.
+            horizontal_count (int): Amount of LEDs of top and bottom strips without leds.
+            vertical_count (int): Amount of LEDs of left and right strips without leds.
+        """
+        parser = configparser.ConfigParser()
+        if not parser.read(path):
+            raise FileNotFoundError(f"Layout file '{path}' not found.")
+
+        def fractions(section, key, default):
+            if key not in section:
+                return default
+            return tuple(float(value) for value in section[key].split(","))
+
+        default_leds = {"top": horizontal_count, "bottom": horizontal_count, "left": vertical_count, "right": vertical_count}
+        strips = []
+        for name in parser.sections():
+            section = parser[name]
+            if "id" not in section:
+                raise ValueError(f"Strip '{name}' of layout file '{path}' has no id.")
+            border = section.get("border", "full")
+            strips.append(
+                StripLayout(
+                    name,
+                    section.getint("id"),
+                    border,
+                    section.getint("leds", default_leds.get(border, 1)),
+                    section.get("direction", "forward"),
+                    section.getfloat("depth", 0.02),
+                    section.getfloat("inset", -1),
+                    section.getfloat("start", 0),
+                    section.getfloat("end", 1),
+                    fractions(section, "rect", (0, 0, 1, 1)),
+                    fractions(section, "screen", (0, 0, 1, 1)),
+                )
+            )
+        return Layout(strips)
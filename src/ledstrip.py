@@ -1,23 +1,33 @@
 # This class represents a LED strip and controls all its pixel colors.
+# The colors are stored as uint8, the same format as they are broadcasted in.
+# Multiple LedStrips can share one contiguous buffer by passing a view of that buffer as colors.
 
 import numpy as np
 
 
 class LedStrip:
-    def __init__(self, id: int, led_count: int) -> None:
+    __slots__ = ("id", "led_count", "colors", "color_test_index")
+
+    color_cycle = np.array([[255, 0, 0], [0, 255, 0], [0, 0, 255]], dtype=np.uint8)
+
+    def __init__(self, id: int, led_count: int, colors: np.ndarray = None) -> None:
         """
         Initialize the LED strip.
 
         Args:
             id (int): Identifier for the LED strip. Must be unique! Map this on the id set on each Arduino
             led_count (int): Number of LEDs in the strip.
+            colors (np.ndarray): Optional (led_count, 3) uint8 view to store the colors in, a new array is allocated if None.
         """
         self.id = id
         self.led_count = led_count
-        self.colors = np.zeros((led_count, 3))  # Default color is off (black).
+        if colors is None:
+            colors = np.zeros((led_count, 3), dtype=np.uint8)  # Default color is off (black).
+        elif colors.shape != (led_count, 3) or colors.dtype != np.uint8:
+            raise ValueError(f"The colors of a LedStrip must be a ({led_count}, 3) uint8 array.")
+        self.colors = colors
 
         self.color_test_index = 0
-        self.color_cycle = np.array([[255, 0, 0], [0, 255, 0], [0, 0, 255]])
 
     def update_light(self, index: id, color: np.ndarray) -> None:
         """
@@ -1,14 +1,20 @@
 # This is the main script, it will read the HDMI input stream, calculate average colors, and send it to the LED strip
+# The heavy modules are only imported after parsing the arguments, the time each startup phase takes is printed at the first frame.
 
-import cv2
 import argparse
 import time
-from colorfactory import ColorFactory
-from transmitter import Transmitter
-from powermanager import PowerManager
 from pathlib import Path
 import configparser
-import numpy as np
+
+startup_time = time.perf_counter()
+startup_phases = {}  # name of the phase -> seconds since the previous phase
+
+
+def mark_startup_phase(name: str) -> None:
+    global startup_time
+    now = time.perf_counter()
+    startup_phases[name] = now - startup_time
+    startup_time = now
 
 config = configparser.ConfigParser()
 config.read("config.ini")
@@ -16,8 +22,71 @@ config.read("config.ini")
 COLORS_IN_PAYLOAD = config.getint("parameters", "COLORS_IN_PAYLOAD")
 HORIZONTAL_LEDS = config.getint("parameters", "HORIZONTAL_LEDS")
 VERTICAL_LEDS = config.getint("parameters", "VERTICAL_LEDS")
+LAYOUT_FILE = config.get("parameters", "LAYOUT_FILE")
 STANDBY_SECONDS = config.getint("parameters", "STANDBY_SECONDS")
+IDLE_WINDOW_SECONDS = config.getfloat("parameters", "IDLE_WINDOW_SECONDS")
+IDLE_THRESHOLD = config.getfloat("parameters", "IDLE_THRESHOLD")
+WAKE_THRESHOLD = config.getfloat("parameters", "WAKE_THRESHOLD")
 MODE = config.get("parameters", "MODE")
+STATIC_FRAME_TOLERANCE = config.getfloat("parameters", "STATIC_FRAME_TOLERANCE")
+HEALTHBAR_MAX_MISSES = config.getint("parameters", "HEALTHBAR_MAX_MISSES")
+HEALTHBAR_MAX_SEARCH_INTERVAL = config.getint("parameters", "HEALTHBAR_MAX_SEARCH_INTERVAL")
+HEALTHBAR_REFINE_RATE = config.getfloat("parameters", "HEALTHBAR_REFINE_RATE")
+ONNX_OPTIONS = {
+    "intra_op_threads": config.getint("parameters", "ONNX_INTRA_OP_THREADS"),
+    "inter_op_threads": config.getint("parameters", "ONNX_INTER_OP_THREADS"),
+    "optimization_level": config.get("parameters", "ONNX_OPTIMIZATION_LEVEL"),
+    "execution_mode": config.get("parameters", "ONNX_EXECUTION_MODE"),
+    "cache_optimized_model": config.getboolean("parameters", "ONNX_CACHE_OPTIMIZED_MODEL"),
+}
+ASYNC_INFERENCE = config.getboolean("parameters", "ASYNC_INFERENCE")
+CAPTURE_FORMAT = config.get("parameters", "CAPTURE_FORMAT")
+CAPTURE_WIDTH = config.getint("parameters", "CAPTURE_WIDTH")
+CAPTURE_HEIGHT = config.getint("parameters", "CAPTURE_HEIGHT")
+CAPTURE_BUFFER_SIZE = config.getint("parameters", "CAPTURE_BUFFER_SIZE")
+CAPTURE_SKIP_FRAMES = config.getint("parameters", "CAPTURE_SKIP_FRAMES")
+TARGET_FPS = config.getfloat("parameters", "TARGET_FPS")
+OUTPUT_FPS = config.getfloat("parameters", "OUTPUT_FPS")
+DELTA_THRESHOLD = config.getint("parameters", "DELTA_THRESHOLD")
+KEYFRAME_CHUNKS = config.getint("parameters", "KEYFRAME_CHUNKS")
+PACKETS_PER_SECOND = config.getfloat("parameters", "PACKETS_PER_SECOND")
+STRIP_WEIGHTS = {}  # name of the strip -> weight
+for item in config.get("parameters", "STRIP_WEIGHTS").split(","):
+    name, weight = item.split(":")
+    STRIP_WEIGHTS[name.strip()] = float(weight)
+DEFER_MODEL_LOADING = config.getboolean("parameters", "DEFER_MODEL_LOADING")
+CONTENT_DETECT_INTERVAL = config.getint("parameters", "CONTENT_DETECT_INTERVAL")
+CONTENT_BLACK_THRESHOLD = config.getint("parameters", "CONTENT_BLACK_THRESHOLD")
+
+
+def read_color_correction(config: configparser.ConfigParser) -> tuple:
+    # GAMMA, WHITE_BALANCE, SATURATION, MIN_BRIGHTNESS and BRIGHTNESS, these are read again when config.ini changes
+    return (
+        config.getfloat("parameters", "GAMMA"),
+        tuple(float(factor) for factor in config.get("parameters", "WHITE_BALANCE").split(",")),
+        config.getfloat("parameters", "SATURATION"),
+        config.getint("parameters", "MIN_BRIGHTNESS"),
+        config.getint("parameters", "BRIGHTNESS"),
+    )
+
+
+COLOR_CORRECTION = read_color_correction(config)
+RADIO = config.get("parameters", "RADIO")
+NRF24_RADIOS = []  # (CE_PIN, CSN_PIN, CHANNEL) of every radio
+for item in config.get("parameters", "NRF24_RADIOS").split(","):
+    NRF24_RADIOS.append(tuple(int(value) for value in item.split(":")))
+STRIP_CODECS = {}  # name of the strip -> name of the codec
+for item in config.get("parameters", "STRIP_CODECS").split(","):
+    name, codec = item.split(":")
+    STRIP_CODECS[name.strip()] = codec.strip()
+STRIP_RADIOS = {}  # name of the strip -> index of the radio in NRF24_RADIOS
+for item in config.get("parameters", "STRIP_RADIOS").split(","):
+    name, index = item.split(":")
+    STRIP_RADIOS[name.strip()] = int(index)
+VIRTUAL_RADIO_LOSS = config.getfloat("parameters", "VIRTUAL_RADIO_LOSS")
+METRICS_FILE = config.get("parameters", "METRICS_FILE")
+METRICS_PORT = config.getint("parameters", "METRICS_PORT")
+METRICS_INTERVAL = config.getfloat("parameters", "METRICS_INTERVAL")
 
 if __name__ == "__main__":
     # Parse command-line arguments
@@ -27,18 +96,114 @@ if __name__ == "__main__":
     parser.add_argument("--preview", action="store_true", help="Show preview")
     parser.add_argument("--dark", action="store_true", help="No data broadcasting")
     parser.add_argument("--duration", type=int, default=-1, help="Duration in seconds")
+    parser.add_argument(
+        "--pipeline", action="store_true", help="Capture, calculate and transmit on separate threads"
+    )
     commandlineargs = parser.parse_args()
+    mark_startup_phase("arguments")
+
+    import cv2
+    import numpy as np
+    from colorfactory import ColorFactory
+    from powermanager import PowerManager
+    from pipeline import Pipeline
+    from framepacer import FramePacer
+    from healthbar import HealthbarTracker
+    from contentarea import ContentArea
+    from layout import Layout
+    from colorcorrection import ColorCorrection
+    from capture import Capture
+    from metrics import metrics
+    mark_startup_phase("imports")
+
+    if METRICS_FILE or METRICS_PORT > 0:
+        metrics.enable()
+        if METRICS_PORT > 0:
+            metrics.serve(METRICS_PORT)
+            print(f"Serving metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+        if METRICS_FILE:
+            print(f"Writing metrics to '{METRICS_FILE}' every {METRICS_INTERVAL} seconds")
 
     # Initialize color factory
-    color_factory = ColorFactory(HORIZONTAL_LEDS, VERTICAL_LEDS, MODE)
+    healthbar_tracker = HealthbarTracker(HEALTHBAR_MAX_MISSES, HEALTHBAR_MAX_SEARCH_INTERVAL, HEALTHBAR_REFINE_RATE)
+    content_area = None
+    if CONTENT_DETECT_INTERVAL > 0:
+        content_area = ContentArea(CONTENT_DETECT_INTERVAL, CONTENT_BLACK_THRESHOLD)
+    color_correction = ColorCorrection(*COLOR_CORRECTION)
+    config_mtime = Path("config.ini").stat().st_mtime
+    layout = None
+    if LAYOUT_FILE:
+        layout = Layout.from_file(LAYOUT_FILE, HORIZONTAL_LEDS, VERTICAL_LEDS)
+        print(f"Using layout '{LAYOUT_FILE}': {', '.join(strip.name for strip in layout.strips)}")
+    color_factory = ColorFactory(
+        HORIZONTAL_LEDS,
+        VERTICAL_LEDS,
+        MODE,
+        STATIC_FRAME_TOLERANCE,
+        healthbar_tracker,
+        ONNX_OPTIONS,
+        ASYNC_INFERENCE,
+        DEFER_MODEL_LOADING,
+        content_area,
+        layout,
+        color_correction,
+    )
+    mark_startup_phase("color factory")
 
     if not commandlineargs.dark:
         print("Broadcasting data enabled")
         # Initialize transmitter and power manager
-        transmitter = Transmitter(COLORS_IN_PAYLOAD)
-        pm = PowerManager(STANDBY_SECONDS, transmitter, color_factory)
+        from transmitter import Transmitter
+
+        # strips of the config that are not in the layout are ignored
+        strips_by_name = color_factory.led_strips
+        strip_weights = {strips_by_name[name].id: weight for name, weight in STRIP_WEIGHTS.items() if name in strips_by_name}
+        strip_codecs = {strips_by_name[name].id: codec for name, codec in STRIP_CODECS.items() if name in strips_by_name}
+        strip_radios = {strips_by_name[name].id: index for name, index in STRIP_RADIOS.items() if name in strips_by_name}
+        if max(strip_radios.values(), default=0) >= len(NRF24_RADIOS):
+            raise ValueError(f"STRIP_RADIOS uses a radio that is not in NRF24_RADIOS: {NRF24_RADIOS}")
+
+        if RADIO == "VIRTUAL":
+            from virtualradio import VirtualRadio
+            from receiver import Receiver
+
+            print(f"Broadcasting to simulated receivers, packet loss: {VIRTUAL_RADIO_LOSS}")
+
+        # One transmitter for every radio, the strips are spread over them
+        transmitters = []
+        for index, (ce_pin, csn_pin, channel) in enumerate(NRF24_RADIOS):
+            if RADIO == "VIRTUAL":
+                radio = VirtualRadio(VIRTUAL_RADIO_LOSS, realtime=True)
+                for strip in color_factory.get_strips():
+                    if strip_radios.get(strip.id, 0) == index:
+                        radio.attach(Receiver(strip.id, COLORS_IN_PAYLOAD, strip.led_count))
+            else:
+                radio = Transmitter.create_radio(ce_pin, csn_pin, channel)
+            transmitters.append(
+                Transmitter(
+                    COLORS_IN_PAYLOAD,
+                    DELTA_THRESHOLD,
+                    KEYFRAME_CHUNKS,
+                    radio,
+                    PACKETS_PER_SECOND,
+                    strip_weights,
+                    strip_codecs,
+                )
+            )
+
+        if len(transmitters) == 1:
+            transmitter = transmitters[0]
+        else:
+            from fanout import FanOut
+
+            print(f"Broadcasting with {len(transmitters)} radios")
+            transmitter = FanOut(transmitters, strip_radios)
+        pm = PowerManager(
+            STANDBY_SECONDS, transmitter, color_factory, IDLE_WINDOW_SECONDS, IDLE_THRESHOLD, WAKE_THRESHOLD
+        )
     else:
         print("Broadcasting data disabled")
+    mark_startup_phase("transmitter")
 
     # Define the recording duration
     duration = commandlineargs.duration
@@ -47,29 +212,25 @@ if __name__ == "__main__":
         print(f"Processing 'video.mp4'")
         current_path = Path.cwd()
         # Stream local video file
-        vc = cv2.VideoCapture(str(current_path / "video.mp4"))
+        vc = Capture(str(current_path / "video.mp4"))
     else:
         # Stream local HDMI video captured with HDMI to USB device
         print("Processing HDMI data")
-        vc = cv2.VideoCapture(0)
-        if MODE == "AVERAGE":
-            vc.set(cv2.CAP_PROP_FRAME_WIDTH, 480) # leave on 480 for the YOLO models
-            vc.set(cv2.CAP_PROP_FRAME_HEIGHT, 480) # leave on 480 for the YOLO models
+        vc = Capture(
+            0, MODE, CAPTURE_FORMAT, CAPTURE_WIDTH, CAPTURE_HEIGHT, CAPTURE_BUFFER_SIZE, CAPTURE_SKIP_FRAMES
+        )
+        print(f"Capturing {vc.describe()}")
 
     if not vc.isOpened() and not commandlineargs.dark:
         print("Error: Could not open video stream.")
         # Blink 5 LEDs in blue color to indicate this error.
         for _ in range(0, 10):
-            now = time.time()
-            strips = color_factory.set_strips(np.array([255, 0, 0]))
-            while time.time() - now <= 0.5:
-                transmitter.update_receivers(strips)
-            now = time.time()
-            strips = color_factory.set_strips(np.array([0, 0, 0]))
-            while time.time() - now <= 0.5:
-                transmitter.update_receivers(strips)
+            transmitter.repeat(color_factory.set_strips(np.array([255, 0, 0])), 0.5)
+            transmitter.repeat(color_factory.set_strips(np.array([0, 0, 0])), 0.5)
         exit()
 
+    mark_startup_phase("capture")
+
     # Get frame properties for recording
     frame_width = int(vc.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(vc.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -83,6 +244,23 @@ if __name__ == "__main__":
     if commandlineargs.preview:
         print(f"Previewing enabled")
 
+    # Capture and transmit on their own threads, the main loop only calculates the colors
+    reader, sender = vc, None if commandlineargs.dark else transmitter
+    interpolate = OUTPUT_FPS > 0 and not commandlineargs.dark
+    if interpolate:
+        # Broadcast at a fixed rate, fading between the calculated frames
+        from interpolator import Interpolator
+
+        print(f"Interpolating output at {OUTPUT_FPS} FPS")
+        interpolator = Interpolator(sender, OUTPUT_FPS)
+        interpolator.start()
+        sender = interpolator
+    if commandlineargs.pipeline:
+        print("Pipelining enabled")
+        pipeline = Pipeline(vc, sender)
+        pipeline.start()
+        reader, sender = pipeline, pipeline
+
     if duration > 0:
         print(f"Running for {duration} seconds...")
     else:
@@ -92,15 +270,26 @@ if __name__ == "__main__":
     # Start the timer
     start_time = time.time()
     last_print_time = start_time  # Time of the last FPS print
+    last_metrics_time = start_time  # Time of the last metrics file write
     frame_count = 0  # Number of frames processed
 
+    pacer = FramePacer(TARGET_FPS)
+
     is_idle = False
     while True:
-        rval, frame = vc.read()
+        rval, frame = reader.read()
         if not rval:
             break
         frame_with_squares, led_strips = color_factory.calculate_colors(frame)
 
+        if "first frame" not in startup_phases:
+            mark_startup_phase("first frame")
+            print("Startup: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_phases.items()))
+
+        # check to power down after certain time of inactivity
+        if not commandlineargs.dark:
+            is_idle = pm.update()
+
         # Record the frame if recording is enabled
         if commandlineargs.record:
             out.write(frame_with_squares)
@@ -110,6 +299,7 @@ if __name__ == "__main__":
 
         # Increment frame count
         frame_count += 1
+        metrics.increment("frames")
 
         # Check if seconds have passed for printing FPS
         elapsed_time = time.time() - last_print_time
@@ -118,11 +308,25 @@ if __name__ == "__main__":
             fps = frame_count / elapsed_time  # Calculate FPS
 
             if not commandlineargs.dark:
-                # check to power down after certain time of inactivity
-                is_idle = pm.is_idle(led_strips)
+                print(f"Inactive time: {pm.inactive_time():.1f}")
                 print(f"Idle status: {is_idle}")
 
             print(f"FPS: {fps:.2f}")
+            if TARGET_FPS > 0:
+                print(f"Frames over budget: {pacer.reset_overruns()}")
+            if commandlineargs.pipeline:
+                print(f"Dropped frames: {pipeline.dropped_frames()}")
+
+            # Rebuild the color correction when its settings in config.ini changed
+            if Path("config.ini").stat().st_mtime != config_mtime:
+                config_mtime = Path("config.ini").stat().st_mtime
+                try:
+                    config.read("config.ini")
+                    if color_correction.configure(*read_color_correction(config)):
+                        print(f"Color correction changed: {color_correction.settings}")
+                except (configparser.Error, ValueError) as e:
+                    # keep the current correction, the file might be saved halfway
+                    print(f"Color correction not changed: {e}")
 
             # Reset counters
             last_print_time = time.time()
@@ -130,7 +334,11 @@ if __name__ == "__main__":
 
         # Do not transmit colours when idle
         if not commandlineargs.dark and not is_idle:
-            transmitter.update_receivers(led_strips)
+            sender.update_receivers(led_strips)
+
+        if METRICS_FILE and time.time() - last_metrics_time >= METRICS_INTERVAL:
+            metrics.write_file(METRICS_FILE)
+            last_metrics_time = time.time()
 
         # Check if seconds have passed
         total_elapsed_time = time.time() - start_time
@@ -138,15 +346,26 @@ if __name__ == "__main__":
             print("Finished.")
             break
 
-        # Check for ESC key to stop early
-        if cv2.waitKey(20) == 27:  # ESC key to exit
+        # Check for ESC key to stop early, the keyboard can only be read through the preview window
+        if commandlineargs.preview and cv2.waitKey(1) == 27:  # ESC key to exit
             print("Recording stopped by user.")
             break
 
+        # Sleep for what is left of the frame budget
+        pacer.wait()
+
     # Release resources
+    if commandlineargs.pipeline:
+        pipeline.stop()
+    if interpolate:
+        interpolator.stop()
+    color_factory.close()
     if not commandlineargs.dark:
         transmitter.close()
     vc.release()
+    if METRICS_FILE:
+        metrics.write_file(METRICS_FILE)
+    metrics.close()
     if commandlineargs.record:
         out.release()
     cv2.destroyAllWindows()
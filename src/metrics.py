@@ -0,0 +1,153 @@
+# This module keeps timing histograms and counters of every stage, so the bottleneck of an installation can be found without a profiler.
+# The metrics are exported in the Prometheus text format, through a periodically rewritten file and/or a local HTTP endpoint.
+# Metrics are disabled by default: timers and counters then return immediately, so instrumenting the hot paths costs next to nothing.
+# Use the shared instance: from metrics import metrics
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Histogram:
+    # upper bounds of the buckets in seconds, the last bucket (+Inf) catches everything above
+    bounds = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(Histogram.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(Histogram.bounds, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Timer:
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    null_timer = contextlib.nullcontext()
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}  # name -> Histogram
+        self.counters = {}  # name -> int
+        self.samples = None  # name -> every duration since the last take_samples(), only kept when enabled to keep them
+        self.server = None
+
+    def enable(self, keep_samples: bool = False) -> None:
+        """
+        Enable the timers and counters.
+
+        Args:
+            keep_samples (bool): Also keep every duration, so exact percentiles can be calculated (see take_samples).
+        """
+        self.enabled = True
+        if keep_samples:
+            self.samples = {}
+
+    def timer(self, name: str):
+        """
+        Time a stage: with metrics.timer("capture"): ...
+
+        Args:
+            name (str): Name of the histogram to add the duration to.
+        """
+        if not self.enabled:
+            return Metrics.null_timer
+        return Timer(self, name)
+
+    def observe(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if self.samples is not None:
+                self.samples.setdefault(name, []).append(seconds)
+
+    def take_samples(self) -> dict:
+        # returns the durations of every stage since the last call, and starts collecting them again
+        with self.lock:
+            samples, self.samples = self.samples, {}
+        return samples
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE moody_{name}_total counter")
+                lines.append(f"moody_{name}_total {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f"# TYPE moody_{name}_seconds histogram")
+                cumulative = 0
+                for bound, count in zip(Histogram.bounds + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'moody_{name}_seconds_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"moody_{name}_seconds_sum {histogram.sum}")
+                lines.append(f"moody_{name}_seconds_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path: str) -> None:
+        # Write to a temporary file first, so readers never see a half written file
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as file:
+            file.write(self.to_prometheus())
+        os.replace(temporary_path, path)
+
+    def serve(self, port: int) -> None:
+        """
+        Serve the metrics on http://127.0.0.1:<port>/metrics from a background thread.
+
+        Args:
+            port (int): Local port to listen on.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass  # don't print every request
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+
+
+metrics = Metrics()
@@ -0,0 +1,70 @@
+# This class encodes the colors of a chunk (id + offset) into the payload that is broadcasted to the arduino's.
+# Every chunk gets its own preallocated payload buffer, with the id and offset already written into the first 2 bytes.
+# Encoding a chunk only copies the colors straight into that buffer, no Python lists or new bytes objects are created.
+# Every strip can use its own codec (see colorcodecs.py) to fit more colors in a payload, the default RAW codec sends 3 bytes
+# per color.
+# The offset is one byte, so the chunks of a strip must start within its first 256 colors.
+
+import numpy as np
+from colorcodecs import CODECS
+
+
+class PayloadEncoder:
+    def __init__(self, COLORS_IN_PAYLOAD: int, STRIP_CODECS: dict = None) -> None:
+        """
+        Initialize the payload encoder.
+
+        Args:
+            COLORS_IN_PAYLOAD (int): Amount of colors in every RAW payload, the payload size is 2 + 3 * COLORS_IN_PAYLOAD bytes.
+            STRIP_CODECS (dict): Id of the LedStrip -> name of its codec in colorcodecs.CODECS, RAW for strips that are not in it.
+        """
+        self.COLORS_IN_PAYLOAD = COLORS_IN_PAYLOAD
+        self.codecs = {}  # id -> codec
+        instances = {}  # name -> codec, new instances so encoders on other threads don't share the buffers of a codec
+        for id, name in (STRIP_CODECS if STRIP_CODECS is not None else {}).items():
+            if name not in CODECS:
+                raise ValueError(f"Unknown codec '{name}', options are: {list(CODECS)}")
+            if name not in instances:
+                instances[name] = type(CODECS[name])()
+            self.codecs[id] = instances[name]
+        self.buffers = {}  # (id, offset) -> (payload as numpy array, memoryview of the same payload)
+
+    def get_codec(self, id: int):
+        return self.codecs.get(id, CODECS["RAW"])
+
+    def colors_per_payload(self, id: int) -> int:
+        return self.get_codec(id).capacity(self.COLORS_IN_PAYLOAD)
+
+    def get_buffer(self, id: int, offset: int) -> tuple[np.ndarray, memoryview]:
+        buffer = self.buffers.get((id, offset))
+        if buffer is None:
+            if not 0 < id < 32:
+                raise ValueError(f"Id '{id}' doesn't fit in the 5 bits of the id byte.")
+            if not 0 <= offset < 256:
+                raise ValueError(
+                    f"Offset '{offset}' of strip {id} doesn't fit in the offset byte, the strip has too many LEDs "
+                    f"for {self.colors_per_payload(id)} colors per payload."
+                )
+            codec = self.get_codec(id)
+            payload = bytearray(codec.payload_size(self.COLORS_IN_PAYLOAD))  # unused colors are padded with zeros
+            payload[0] = codec.number << 5 | id
+            payload[1] = offset
+            buffer = (np.frombuffer(payload, dtype=np.uint8), memoryview(payload))
+            self.buffers[(id, offset)] = buffer
+        return buffer
+
+    def encode(self, id: int, offset: int, colors: np.ndarray) -> memoryview:
+        """
+        Write the colors of a chunk into its payload.
+
+        Args:
+            id (int): Id of the LedStrip the colors belong to.
+            offset (int): Index of the first color in the LedStrip.
+            colors (np.ndarray): (x, 3) array of at most colors_per_payload(id) colors.
+
+        Returns:
+            memoryview: The payload, only valid until the same chunk is encoded again.
+        """
+        payload, view = self.get_buffer(id, offset)
+        self.get_codec(id).encode(payload[2:], colors)
+        return view
@@ -0,0 +1,182 @@
+# This class runs the capture and the transmission of the colors on their own threads.
+# The main loop only calculates the colors, so the capture latency of the HDMI to USB device and the SPI writes to the radio
+# overlap with the color calculation instead of adding up every frame.
+# The stages hand over their data through single slot queues: a new value replaces an old one that was not picked up yet.
+# Stale frames are dropped this way instead of queueing up and adding latency.
+# The AsyncWorker uses the same slots to run a slow calculation (like YOLO inference) on the most recent frame in the background.
+# Video files are read at their own frame rate, like a capture device delivers its frames.
+
+import threading
+import numpy as np
+from capture import Capture
+from framepacer import FramePacer
+from ledstrip import LedStrip
+from transmitter import Transmitter
+from metrics import metrics
+
+
+class LatestValue:
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.value = None
+        self.has_value = False
+        self.dropped = 0  # amount of values replaced before they were picked up
+
+    def put(self, value) -> None:
+        with self.condition:
+            if self.has_value:
+                self.dropped += 1
+            self.value = value
+            self.has_value = True
+            self.condition.notify()
+
+    def drop(self) -> None:
+        # counts a value that was not put in the slot, because the last one was not picked up yet
+        with self.condition:
+            self.dropped += 1
+
+    def is_full(self) -> bool:
+        return self.has_value
+
+    def get(self, timeout: float = None) -> tuple[bool, object]:
+        """
+        Wait for a new value and take it out of the slot.
+
+        Args:
+            timeout (float): Maximum amount of seconds to wait, None waits forever.
+
+        Returns:
+            tuple[bool, object]: False and None if no new value arrived in time, otherwise True and the value.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.has_value, timeout):
+                return False, None
+            value = self.value
+            self.value = None
+            self.has_value = False
+            return True, value
+
+
+class AsyncWorker:
+    def __init__(self, function) -> None:
+        """
+        Initialize the worker and start its thread.
+
+        Args:
+            function: Called on the background thread with the most recent submitted value, its result can be polled.
+        """
+        self.function = function
+        self.inputs = LatestValue()
+        self.results = LatestValue()
+        self.error = None  # exception that ended the worker thread, raised by poll()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.work_loop, daemon=True)
+        self.thread.start()
+
+    def work_loop(self) -> None:
+        while not self.stopped.is_set():
+            has_value, value = self.inputs.get(timeout=0.1)
+            if has_value:
+                try:
+                    self.results.put(self.function(value))
+                except Exception as e:
+                    # the worker stops, the error is raised by the next poll() instead of going unnoticed
+                    self.error = e
+                    return
+
+    def submit(self, value) -> None:
+        # replaces the previous value if the worker didn't start on it yet
+        self.inputs.put(value)
+
+    def poll(self) -> tuple[bool, object]:
+        # returns True and the newest result if a new result is ready, without waiting
+        if self.error is not None:
+            raise RuntimeError("The background worker stopped") from self.error
+        return self.results.get(timeout=0)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+class Pipeline:
+    def __init__(self, vc: Capture, transmitter: Transmitter = None) -> None:
+        """
+        Initialize the pipeline.
+
+        Args:
+            vc (Capture): Opened capture to read frames from.
+            transmitter (Transmitter): Transmitter to send the colors with, None disables the transmit stage.
+        """
+        self.vc = vc
+        self.transmitter = transmitter
+        self.frames = LatestValue()
+        self.colors = LatestValue()
+        self.stopped = threading.Event()
+        self.capture_error = None  # exception that ended the capture thread, raised by read()
+        self.lock = threading.Lock()  # guards mirror_strips, which both the main loop and the transmit stage use
+        self.threads = [threading.Thread(target=self.capture_loop, daemon=True)]
+        if transmitter is not None:
+            self.threads.append(threading.Thread(target=self.transmit_loop, daemon=True))
+
+        # the transmit stage sends copies of the strips, so the main loop can already write the colors of the next frame
+        self.mirror_strips = []
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+    def capture_loop(self) -> None:
+        # a video file would otherwise be read as fast as possible, and most frames counted as dropped
+        pacer = FramePacer(self.vc.file_fps())
+        try:
+            while not self.stopped.is_set():
+                # Only decode the frame if the previous one was picked up, otherwise it would be dropped anyway
+                decode = not self.frames.is_full()
+                rval, frame = self.vc.read(decode)
+                if not rval:
+                    break
+                if decode:
+                    self.frames.put((rval, frame))
+                else:
+                    self.frames.drop()
+                    metrics.increment("dropped_frames")
+                pacer.wait()
+        except Exception as e:
+            self.capture_error = e
+        finally:
+            # read() waits without a timeout, so it must always learn that no frames will come anymore
+            self.frames.put((False, None))
+
+    def transmit_loop(self) -> None:
+        while not self.stopped.is_set():
+            has_value, colors = self.colors.get(timeout=0.1)
+            if not has_value:
+                continue
+            with self.lock:
+                mirror_strips = self.mirror_strips
+                for strip, strip_colors in zip(mirror_strips, colors):
+                    strip.colors[:] = strip_colors
+            self.transmitter.update_receivers(mirror_strips)
+
+    def read(self) -> tuple[bool, np.ndarray]:
+        # drop-in replacement of VideoCapture.read(), returns the most recent captured frame
+        _, (rval, frame) = self.frames.get()
+        if not rval and self.capture_error is not None:
+            raise RuntimeError("The capture thread stopped") from self.capture_error
+        return rval, frame
+
+    def update_receivers(self, led_strips: list[LedStrip]) -> None:
+        # drop-in replacement of Transmitter.update_receivers(), hands a copy of the colors over to the transmit stage
+        with self.lock:
+            if len(self.mirror_strips) != len(led_strips):
+                self.mirror_strips = [LedStrip(strip.id, strip.led_count) for strip in led_strips]
+        self.colors.put([strip.colors.copy() for strip in led_strips])
+
+    def dropped_frames(self) -> int:
+        return self.frames.dropped + self.colors.dropped
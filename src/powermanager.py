@@ -1,67 +1,85 @@
 # This script will calculate the percentage the average colors changed
 # When the threshold of time has passed, during which the change percentage did not exceed a certain percentage: shutdown.
+# The change is measured every frame against the colors at the start of an evaluation window, so short bursts of motion are not missed.
 
-from ledstrip import LedStrip
 import numpy as np
 import time
+from metrics import metrics
 from transmitter import Transmitter
 from colorfactory import ColorFactory
 import os
 
 
 class PowerManager:
-    def __init__(self, STANDBY_SECONDS: int, tr: Transmitter, cf: ColorFactory) -> None:
+    def __init__(
+        self,
+        STANDBY_SECONDS: int,
+        tr: Transmitter,
+        cf: ColorFactory,
+        IDLE_WINDOW_SECONDS: float = 1,
+        IDLE_THRESHOLD: float = 0.1,
+        WAKE_THRESHOLD: float = 0.5,
+    ) -> None:
         self.STANDBY_SECONDS = STANDBY_SECONDS
+        self.IDLE_WINDOW_SECONDS = IDLE_WINDOW_SECONDS
+        self.IDLE_THRESHOLD = IDLE_THRESHOLD  # change percentage below which the colors count as unchanged
+        self.WAKE_THRESHOLD = WAKE_THRESHOLD  # change percentage above which an idle system wakes up again
         self.transmitter = tr
         self.color_factory = cf
 
+        # All buffers are allocated once, updating the change metric every frame does not allocate
+        frame = cf.frame.reshape(-1)
+        self.reference = frame.copy()  # colors at the start of the current evaluation window
+        self.difference = np.zeros(frame.shape, dtype=np.int16)
+        self.max_change = 0  # largest difference with the reference during the current window
+        self.window_start = time.time()
         self.last_different = time.time()
-        self.flattened_strips = np.array([])
+        self.idle = False
 
-    def is_idle(self, led_strips: list[LedStrip]) -> bool:
-        is_idle = False
-        new_image = False
-        if len(self.flattened_strips) == 0:
-            new_image = True
-        else:
-            change_percentage = (
-                np.sum(np.abs(self.flattened_strips - self.flatten_strips(led_strips)))
-                / (len(self.flattened_strips) * 255)
-                * 100
-            )
-            # print(f"Change: {change_percentage} %")
-            new_image = change_percentage > 0.1  # change larger than 1/10th of a percent
+    def update(self) -> bool:
+        """
+        Update the change metric with the current colors, call this every frame.
+        The colors are read from the frame buffer of the color factory, which all its LedStrips are views into.
 
-        if new_image:
-            self.last_different = time.time()
-        else:
-            diff = time.time() - self.last_different
-            print(f"Inactive time: {diff}")
-            if diff >= self.STANDBY_SECONDS:
-                print("POWER OFF")
-                # self.shutdown() # full shutdown currently not used
-                is_idle = True
+        Returns:
+            bool: True if the colors did not change for STANDBY_SECONDS.
+        """
+        frame = self.color_factory.frame.reshape(-1)
+        np.subtract(frame, self.reference, out=self.difference, dtype=np.int16)
+        np.abs(self.difference, out=self.difference)
+        self.max_change = max(self.max_change, int(self.difference.sum()))
 
-        self.flattened_strips = self.flatten_strips(led_strips)
+        now = time.time()
+        if now - self.window_start >= self.IDLE_WINDOW_SECONDS:
+            self.evaluate(now, self.max_change / (frame.size * 255) * 100)
+            np.copyto(self.reference, frame)
+            self.max_change = 0
+            self.window_start = now
 
-        return is_idle
+        return self.idle
 
-    def flatten_strips(self, led_strips: list[LedStrip]) -> np.array:
-        flattened_strips = np.array([])
-        for strip in led_strips:
-            flattened_strips = np.concatenate((flattened_strips, strip.colors.copy().flatten()))
-        return flattened_strips
+    def evaluate(self, now: float, change_percentage: float) -> None:
+        # A higher threshold is needed to wake up than to stay awake, so noise can't toggle the idle status
+        threshold = self.WAKE_THRESHOLD if self.idle else self.IDLE_THRESHOLD
+        if change_percentage > threshold:
+            self.last_different = now
+            if self.idle:
+                print("POWER ON")
+                self.idle = False
+                metrics.increment("idle_transitions")
+        elif not self.idle and now - self.last_different >= self.STANDBY_SECONDS:
+            print("POWER OFF")
+            # self.shutdown() # full shutdown currently not used
+            self.idle = True
+            metrics.increment("idle_transitions")
+
+    def inactive_time(self) -> float:
+        return time.time() - self.last_different
 
     def shutdown(self) -> None:
-        # While statements are used because the no_acknowledge feature is turned on and some packages can go lost
+        # The colors are repeated because the no_acknowledge feature is turned on and some packages can go lost
         for _ in range(0, 20):
-            now = time.time()
-            strips = self.color_factory.set_strips(np.array([0, 0, 255]))
-            while time.time() - now <= 0.5:
-                self.transmitter.update_receivers(strips)
-            now = time.time()
-            strips = self.color_factory.set_strips(np.array([0, 0, 0]))
-            while time.time() - now <= 0.5:
-                self.transmitter.update_receivers(strips)
+            self.transmitter.repeat(self.color_factory.set_strips(np.array([0, 0, 255])), 0.5)
+            self.transmitter.repeat(self.color_factory.set_strips(np.array([0, 0, 0])), 0.5)
 
         os.system("sudo shutdown now")
@@ -0,0 +1,90 @@
+# This class is a Python model of arduino_receiver.ino, so the LED strips can be simulated without any Arduino.
+# receive() decodes a payload like handleData(): payloads of other ids are ignored, the colors are written from the offset on.
+# The payloads are decoded with the reference decoder of the codecs, so every codec of colorcodecs.py is understood.
+# show() calculates the LED colors like loop(): the received colors are spread out over the LEDs and faded in with the
+# transition speed, after the timeout without payloads all LEDs fade to black. Both use the integer math of the Arduino.
+# The colors are kept in BGR order like the LedStrip colors, so both can be compared directly.
+
+import time
+import numpy as np
+from colorcodecs import decode_payload
+
+
+class Receiver:
+    def __init__(
+        self,
+        ID: int,
+        COLORS_IN_PAYLOAD: int,
+        COLOR_COUNT: int,
+        LED_COUNT: int = 0,
+        strip_orientation: bool = True,
+        transition_speed: int = 26,
+        timeout: float = 30,
+    ) -> None:
+        """
+        Initialize the receiver, the parameters match the defines of arduino_receiver.ino.
+
+        Args:
+            ID (int): Id of the LedStrip this receiver shows.
+            COLORS_IN_PAYLOAD (int): Amount of colors in every payload.
+            COLOR_COUNT (int): Amount of colors sent for this id.
+            LED_COUNT (int): Amount of LEDs on the strip, 0 uses COLOR_COUNT.
+            strip_orientation (bool): False reverses the colors on the strip.
+            transition_speed (int): Part of the difference with the target color that is faded every show(), in 256ths.
+            timeout (float): Seconds without payloads after which the LEDs are turned off.
+        """
+        self.ID = ID
+        self.COLORS_IN_PAYLOAD = COLORS_IN_PAYLOAD
+        self.COLOR_COUNT = COLOR_COUNT
+        self.LED_COUNT = LED_COUNT if LED_COUNT > 0 else COLOR_COUNT
+        self.strip_orientation = strip_orientation
+        self.transition_speed = transition_speed
+        self.timeout = timeout
+
+        self.colors = np.zeros((COLOR_COUNT, 3), dtype=np.uint8)  # currentColors
+        self.leds = np.zeros((self.LED_COUNT, 3), dtype=np.uint8)  # colors shown on the strip
+        self.received = 0  # amount of payloads for this id
+        self.last_activity = time.time()
+
+        # position of every LED between the two colors it blends in 256ths, fixed for the lifetime of the receiver
+        position = np.arange(self.LED_COUNT) * (COLOR_COUNT - 1) * 256 // max(self.LED_COUNT - 1, 1)
+        self.index_low = position >> 8
+        self.blend_factor = (position & 0xFF)[:, np.newaxis]
+        self.index_high = self.index_low + (position & 0xFF > 0)
+
+    def receive(self, payload: bytes) -> None:
+        if len(payload) < 2 or payload[0] & 0x1F != self.ID:
+            return
+        self.received += 1
+        self.last_activity = time.time()
+
+        _, offset, colors = decode_payload(payload, self.COLORS_IN_PAYLOAD)
+        count = max(min(len(colors), self.COLOR_COUNT - offset), 0)  # colors past COLOR_COUNT are skipped
+        if self.strip_orientation:
+            self.colors[offset : offset + count] = colors[:count]
+        else:
+            index = self.COLOR_COUNT - 1 - (offset + np.arange(count))
+            self.colors[index] = colors[:count]
+
+    def show(self, now: float = None) -> np.ndarray:
+        """
+        Fade the LEDs one step towards the received colors.
+
+        Args:
+            now (float): Current time.time(), used for the timeout.
+
+        Returns:
+            np.ndarray: (LED_COUNT, 3) BGR colors shown on the strip.
+        """
+        now = time.time() if now is None else now
+        if now - self.last_activity > self.timeout:
+            target = np.zeros(self.leds.shape, dtype=np.int32)
+        else:
+            low = self.colors[self.index_low].astype(np.int32)
+            high = self.colors[self.index_high].astype(np.int32)
+            target = (low * (256 - self.blend_factor) + high * self.blend_factor) >> 8
+
+        # current + (target - current) * step / 256, rounded down like on the Arduino
+        current = self.leds.astype(np.int32)
+        self.leds[:] = (current * 256 + (target - current) * self.transition_speed) >> 8
+        return self.leds
@@ -0,0 +1,160 @@
+# This class is responsible for sampling the average colors of all zones of a layout in one vectorized pass.
+# The zone rectangles only depend on the image size and the layout, so they are compiled once into a sampling matrix.
+# Every frame an integral image (summed-area table) is built, the sum of every zone is 4 entries of that integral image:
+# the sampling matrix has one row per zone with +1 and -1 at the 4 corners of the zone, stored as indices and signs.
+# All colors are one product of that sparse matrix with the integral image, so the cost hardly grows with the amount of
+# zones and doesn't depend on their size or shape at all.
+
+import numpy as np
+import cv2
+from layout import Layout, StripLayout
+
+
+class ZoneSampler:
+    # signs of the corners (x2, y2), (x2, y1), (x1, y2), (x1, y1) of a zone in the integral image
+    corner_signs = np.array([1, -1, -1, 1], dtype=np.int32)
+
+    def __init__(self, layout: Layout) -> None:
+        """
+        Initialize the zone sampler.
+
+        Args:
+            layout (Layout): Layout of the strips, the zones of every strip are sampled in the order of the strips.
+        """
+        self.layout = layout
+
+        self.shape = None
+        self.rectangles = np.zeros((0, 4), dtype=np.intp)  # x1, y1, x2, y2 for every zone
+        self.slices = {}  # name of the strip -> its zones
+
+    @staticmethod
+    def get_rectangle(x: float, y: float, h_size: float, v_size: float, height: int, width: int) -> list[int]:
+        # Define square's start and end points
+        x1, y1 = int(x - v_size / 2), int(y - h_size / 2)
+        x2, y2 = int(x + v_size / 2), int(y + h_size / 2)
+        # Ensure the region is within the image bounds
+        return [max(x1, 0), max(y1, 0), min(x2, width), min(y2, height)]
+
+    def strip_rectangles(self, strip: StripLayout, height: int, width: int) -> list[list[int]]:
+        """
+        Calculate the rectangles of the zones of a strip.
+
+        Args:
+            strip (StripLayout): Layout of the strip.
+            height (int): Height of the sampled image.
+            width (int): Width of the sampled image.
+
+        Returns:
+            list[list[int]]: x1, y1, x2, y2 of every zone, in the direction of the strip.
+        """
+        sx1, sy1, sx2, sy2 = (
+            strip.screen[0] * width,
+            strip.screen[1] * height,
+            strip.screen[2] * width,
+            strip.screen[3] * height,
+        )
+        screen_width, screen_height = sx2 - sx1, sy2 - sy1
+
+        rectangles = []
+        if strip.border in ("top", "bottom"):
+            span_start, span_end = sx1 + strip.start * screen_width, sx1 + strip.end * screen_width
+            size = int((span_end - span_start) / strip.leds)
+            thickness = int(screen_height * strip.depth)
+            inset = size / 2 if strip.inset < 0 else strip.inset * screen_height
+            y = sy1 + inset if strip.border == "top" else sy2 - inset
+            for i in np.linspace(span_start + size / 2, span_end - size / 2, strip.leds):
+                rectangles.append(self.get_rectangle(int(i), y, thickness, size, height, width))
+        elif strip.border in ("left", "right"):
+            span_start, span_end = sy1 + strip.start * screen_height, sy1 + strip.end * screen_height
+            size = int((span_end - span_start) / strip.leds)
+            thickness = int(screen_width * strip.depth)
+            inset = size / 2 if strip.inset < 0 else strip.inset * screen_width
+            x = sx1 + inset if strip.border == "left" else sx2 - inset
+            for i in np.linspace(span_start + size / 2, span_end - size / 2, strip.leds):
+                rectangles.append(self.get_rectangle(x, int(i), size, thickness, height, width))
+        elif strip.border == "full":
+            # the whole screen, split into columns when the strip has more than 1 LED
+            edges = np.linspace(sx1, sx2, strip.leds + 1).astype(int)
+            rectangles = [[edges[i], int(sy1), edges[i + 1], int(sy2)] for i in range(strip.leds)]
+        else:
+            x1, y1 = sx1 + strip.rect[0] * screen_width, sy1 + strip.rect[1] * screen_height
+            x2, y2 = sx1 + strip.rect[2] * screen_width, sy1 + strip.rect[3] * screen_height
+            if x2 - x1 >= y2 - y1:
+                edges = np.linspace(x1, x2, strip.leds + 1).astype(int)
+                rectangles = [[edges[i], int(y1), edges[i + 1], int(y2)] for i in range(strip.leds)]
+            else:
+                edges = np.linspace(y1, y2, strip.leds + 1).astype(int)
+                rectangles = [[int(x1), edges[i], int(x2), edges[i + 1]] for i in range(strip.leds)]
+
+        if strip.direction == "reverse":
+            rectangles.reverse()
+        return rectangles
+
+    def strip_bounds(self) -> list[tuple[float, float, float, float]]:
+        """
+        Calculate the area every strip averages, to compare only these bands of the frames (see fingerprint.py).
+
+        Returns:
+            list[tuple[float, float, float, float]]: x1, y1, x2, y2 (parts 0 - 1 of the image) around the zones of every strip.
+        """
+        size = 1000  # the zones only depend on the image size through rounding
+        bounds = []
+        for strip in self.layout.strips:
+            rectangles = np.array(self.strip_rectangles(strip, size, size), dtype=np.intp).reshape(-1, 4)
+            x1, y1 = rectangles[:, :2].min(axis=0)
+            x2, y2 = rectangles[:, 2:].max(axis=0)
+            if x2 > x1 and y2 > y1:
+                bounds.append((float(x1 / size), float(y1 / size), float(x2 / size), float(y2 / size)))
+        return bounds
+
+    def compile(self, height: int, width: int) -> None:
+        """
+        Compile the sampling matrix of all zones for an image of the given size.
+
+        Args:
+            height (int): Height of the sampled image.
+            width (int): Width of the sampled image.
+        """
+        self.slices = {}
+        rectangles = []
+        for strip in self.layout.strips:
+            self.slices[strip.name] = slice(len(rectangles), len(rectangles) + strip.leds)
+            rectangles.extend(self.strip_rectangles(strip, height, width))
+
+        self.rectangles = np.array(rectangles, dtype=np.intp).reshape(-1, 4)
+        x1, y1, x2, y2 = self.rectangles.T
+        # flat indices of the 4 corners of every zone in the (height + 1) x (width + 1) integral image, one row per corner
+        row = width + 1
+        self.corners = np.stack([y2 * row + x2, y1 * row + x2, y2 * row + x1, y1 * row + x1])
+        areas = ((x2 - x1) * (y2 - y1)).clip(min=0)
+        # empty zones get an area of 'infinity' so their average color becomes 0 instead of a division by zero
+        self.areas = np.where(areas > 0, areas, np.inf)[:, np.newaxis]
+        self.shape = (height, width)
+
+    def sample(self, image: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Calculate the average color of every zone.
+
+        Args:
+            image (np.ndarray): BGR image to sample.
+            out (np.ndarray): Optional (zone count, 3) array to write the average colors into.
+
+        Returns:
+            np.ndarray: (zone count, 3) array of average colors, see self.slices for the zones of each strip.
+        """
+        if self.shape != image.shape[:2]:
+            self.compile(*image.shape[:2])
+
+        channels = image.shape[2]
+        integral = cv2.integral(image).reshape(-1, channels)
+        corners = integral.take(self.corners, axis=0).reshape(4, -1)
+        sums = (ZoneSampler.corner_signs @ corners).reshape(-1, channels)
+        if out is None:
+            return (sums / self.areas).astype(int)
+        np.copyto(out, sums / self.areas, casting="unsafe")
+        return out
+
+    def draw(self, image: np.ndarray, colors: np.ndarray) -> None:
+        # only used for debugging purposes, draws every zone filled with its average color
+        for (x1, y1, x2, y2), color in zip(self.rectangles, colors):
+            cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), tuple(map(int, color)), -1)
@@ -0,0 +1,92 @@
+# This class decides which chunks (id + offset) are sent by the transmitter and in what order.
+# The radio only gets PACKETS_PER_SECOND payloads (a token bucket), chunks that don't fit in the budget stay pending.
+# A pending chunk keeps its place in the queue but always sends the latest colors, because it is a view into the LedStrip.
+# The strips take turns by their weight (stride scheduling), so with many LEDs every strip gets its share of the budget
+# and the staleness of a chunk is bounded, instead of the strip that comes last falling behind.
+
+import time
+import numpy as np
+from metrics import metrics
+
+
+class PacketScheduler:
+    def __init__(
+        self,
+        PACKETS_PER_SECOND: float = -1,
+        STRIP_WEIGHTS: dict = None,
+        MAX_BURST_SECONDS: float = 0.1,
+        clock=time.perf_counter,
+    ) -> None:
+        """
+        Initialize the packet scheduler.
+
+        Args:
+            PACKETS_PER_SECOND (float): Maximum amount of payloads per second, 0 or negative doesn't limit the payloads.
+            STRIP_WEIGHTS (dict): Id of the LedStrip -> share of the budget, 1 for strips that are not in it.
+            MAX_BURST_SECONDS (float): Unused budget of at most this many seconds is saved up for the next updates.
+            clock: Function returning the current time in seconds, simulations can replace it with their own time.
+        """
+        self.PACKETS_PER_SECOND = PACKETS_PER_SECOND
+        self.limited = PACKETS_PER_SECOND > 0
+        self.STRIP_WEIGHTS = STRIP_WEIGHTS if STRIP_WEIGHTS is not None else {}
+        self.max_tokens = max(1.0, PACKETS_PER_SECOND * MAX_BURST_SECONDS)
+        self.clock = clock
+
+        self.pending = {}  # id -> {offset: (chunk, time it was queued)}, oldest first
+        self.passes = {}  # id -> virtual time of the next turn of that strip
+        self.virtual_time = 0.0
+        self.tokens = self.max_tokens
+        self.last_refill = clock()
+        self.max_staleness = 0.0  # longest time a chunk waited to be sent
+
+    def enqueue(self, id: int, offset: int, chunk: np.ndarray) -> None:
+        queue = self.pending.setdefault(id, {})
+        if not queue:
+            # a strip that had nothing to send can't claim the turns it skipped
+            self.passes[id] = max(self.passes.get(id, 0.0), self.virtual_time)
+        if offset not in queue:
+            queue[offset] = (chunk, self.clock())
+        else:
+            queue[offset] = (chunk, queue[offset][1])  # keep its place and age
+
+    def is_pending(self, id: int, offset: int) -> bool:
+        return offset in self.pending.get(id, ())
+
+    def refill(self) -> None:
+        if not self.limited:
+            return
+        now = self.clock()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.last_refill) * self.PACKETS_PER_SECOND)
+        self.last_refill = now
+
+    def next_chunks(self):
+        """
+        Take the pending chunks out of the queue that fit in the budget, the strips take turns by their weight.
+
+        Yields:
+            tuple[int, int, np.ndarray]: The id, offset and colors of the next chunk to send.
+        """
+        self.refill()
+        while not self.limited or self.tokens >= 1:
+            ids = [id for id, queue in self.pending.items() if queue]
+            if not ids:
+                return
+            id = min(ids, key=self.passes.__getitem__)
+            self.virtual_time = self.passes[id]
+            self.passes[id] += 1 / self.STRIP_WEIGHTS.get(id, 1)
+
+            queue = self.pending[id]
+            offset = next(iter(queue))
+            chunk, queued = queue.pop(offset)
+            staleness = self.clock() - queued
+            self.max_staleness = max(self.max_staleness, staleness)
+            metrics.observe("chunk_staleness", staleness)
+            if self.limited:
+                self.tokens -= 1
+            yield id, offset, chunk
+
+    def interval(self, chunk_count: int) -> float:
+        # seconds the budget needs to send this many chunks, 0 if the budget is unlimited
+        if not self.limited:
+            return 0.0
+        return chunk_count / self.PACKETS_PER_SECOND
@@ -0,0 +1,60 @@
+# this script serves benchmarking purposes only, no radio is needed
+# it measures how many payloads per second can be encoded, with the old struct.pack encoding and with the PayloadEncoder
+# both encoders are checked to create exactly the same payloads
+import sys
+import os
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(parent_dir)
+
+import argparse
+import struct
+import time
+import numpy as np
+from payload import PayloadEncoder
+
+
+def create_payload_struct(id, offset, colors, COLORS_IN_PAYLOAD) -> bytes:
+    # the encoding used before the PayloadEncoder, kept here to compare with
+    color_data = colors.flatten().tolist()
+
+    if len(color_data) < COLORS_IN_PAYLOAD * 3:
+        color_data.extend([0] * (COLORS_IN_PAYLOAD * 3 - len(color_data)))
+
+    payload_integers = [id, offset] + [int(value) for value in color_data]
+    return struct.pack(f"{len(payload_integers)}B", *payload_integers)
+
+
+def run(encode, chunks, duration) -> float:
+    count = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < duration:
+        for id, offset, colors in chunks:
+            encode(id, offset, colors)
+        count += len(chunks)
+    return count / (time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=2, help="Duration in seconds of each measurement")
+    parser.add_argument("--leds", type=int, default=60, help="Amount of LEDs per strip")
+    parser.add_argument("--colors_in_payload", type=int, default=10, help="Amount of colors in every payload")
+    commandlineargs = parser.parse_args()
+
+    COLORS_IN_PAYLOAD = commandlineargs.colors_in_payload
+    strip_colors = np.random.randint(0, 256, (commandlineargs.leds, 3)).astype(np.uint8)
+    chunks = [
+        (1, offset, strip_colors[offset : offset + COLORS_IN_PAYLOAD])
+        for offset in range(0, commandlineargs.leds, COLORS_IN_PAYLOAD)
+    ]
+
+    encoder = PayloadEncoder(COLORS_IN_PAYLOAD)
+    for id, offset, colors in chunks:
+        assert bytes(encoder.encode(id, offset, colors)) == create_payload_struct(id, offset, colors, COLORS_IN_PAYLOAD)
+
+    before = run(lambda id, offset, colors: create_payload_struct(id, offset, colors, COLORS_IN_PAYLOAD), chunks, commandlineargs.duration)
+    after = run(encoder.encode, chunks, commandlineargs.duration)
+
+    print(f"struct.pack:    {before:12.0f} payloads/s")
+    print(f"PayloadEncoder: {after:12.0f} payloads/s")
+    print(f"Speedup:        {after / before:12.2f}x")
@@ -0,0 +1,161 @@
+# this script serves benchmarking purposes only, no TV, capture device or radio is needed
+# it replays a recorded video file (see main.py --record or the scripts in generate_colors) through the ColorFactory
+# for every combination of mode and LED configuration, with a radio that drops every payload
+# the latency percentiles of every stage, the throughput and the peak memory are written as JSON, so runs can be compared
+# the calculation is split into the stages timed by metrics.py (sampling, preprocess, inference, postprocess), the peak
+# memory is measured in a second, untimed replay, because tracemalloc slows down every allocation
+# run it from the root of the repository, the MINECRAFT mode needs the yolov11_models folder
+import sys
+import os
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(parent_dir)
+
+import argparse
+import contextlib
+import json
+import platform
+import resource
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from colorfactory import ColorFactory
+from transmitter import Transmitter
+from metrics import metrics
+
+
+class NullRadio:
+    # stands in for the nRF24L01, every payload is counted and dropped
+    power = True
+
+    def __init__(self) -> None:
+        self.payloads = 0
+
+    def write(self, buffer, multicast: bool = False) -> bool:
+        self.payloads += 1
+        return True
+
+
+def percentiles(seconds: list[float]) -> dict:
+    milliseconds = np.array(seconds) * 1000
+    if len(milliseconds) == 0:
+        return {}
+    return {
+        "mean_ms": float(milliseconds.mean()),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p90_ms": float(np.percentile(milliseconds, 90)),
+        "p99_ms": float(np.percentile(milliseconds, 99)),
+        "max_ms": float(milliseconds.max()),
+    }
+
+
+def replay(file: str, mode: str, horizontal_leds: int, vertical_leds: int, args, stages: dict = None) -> tuple[int, int]:
+    """
+    Replay the file through a new ColorFactory and Transmitter.
+
+    Args:
+        stages (dict): Name of the stage -> list the duration of every frame is added to, None doesn't time the frames.
+
+    Returns:
+        tuple[int, int]: Amount of replayed frames and amount of payloads sent.
+    """
+    color_factory = ColorFactory(horizontal_leds, vertical_leds, mode, args.static_tolerance)
+    radio = NullRadio()
+    transmitter = Transmitter(args.colors_in_payload, args.delta_threshold, args.keyframe_chunks, radio=radio)
+
+    vc = cv2.VideoCapture(file)
+    frames = 0
+    metrics.take_samples()
+    while frames < args.frames or args.frames < 0:
+        frame_start = time.perf_counter()
+        rval, frame = vc.read()
+        captured = time.perf_counter()
+        if not rval:
+            break
+        _, led_strips = color_factory.calculate_colors(frame)
+        calculated = time.perf_counter()
+        transmitter.update_receivers(led_strips)
+        transmitted = time.perf_counter()
+        frames += 1
+
+        if stages is not None:
+            stages["capture"].append(captured - frame_start)
+            stages["calculate"].append(calculated - captured)
+            stages["transmit"].append(transmitted - calculated)
+            stages["total"].append(transmitted - frame_start)
+            # the stages timed by metrics.py during this frame, the durations of a stage that runs more than once (both
+            # YOLO models) are added up
+            for name, seconds in metrics.take_samples().items():
+                stages.setdefault(name, []).append(sum(seconds))
+    vc.release()
+    color_factory.close()
+    return frames, radio.payloads
+
+
+def run(file: str, mode: str, horizontal_leds: int, vertical_leds: int, args) -> dict:
+    result = {"mode": mode, "horizontal_leds": horizontal_leds, "vertical_leds": vertical_leds}
+    stages = {"capture": [], "calculate": [], "transmit": [], "total": []}
+    try:
+        start_time = time.perf_counter()
+        frames, payloads = replay(file, mode, horizontal_leds, vertical_leds, args, stages)
+        elapsed = time.perf_counter() - start_time
+    except AssertionError as error:  # missing YOLO models
+        result["error"] = str(error)
+        return result
+
+    tracemalloc.start()
+    replay(file, mode, horizontal_leds, vertical_leds, args)
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result["frames"] = frames
+    result["throughput_fps"] = frames / elapsed if elapsed > 0 else 0
+    result["payloads_per_frame"] = payloads / frames if frames > 0 else 0
+    result["stages"] = {name: percentiles(seconds) for name, seconds in stages.items()}
+    result["peak_traced_memory_kib"] = peak_traced // 1024
+    result["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # peak of the whole process so far
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, default="video.mp4", help="Video file to replay")
+    parser.add_argument("--modes", type=str, default="AVERAGE", help="Comma separated modes, for example AVERAGE,MINECRAFT")
+    parser.add_argument(
+        "--leds", type=str, default="10x10", help="Comma separated HORIZONTAL_LEDSxVERTICAL_LEDS, for example 10x10,30x20"
+    )
+    parser.add_argument("--frames", type=int, default=-1, help="Maximum amount of frames per run, -1 replays the whole file")
+    parser.add_argument("--static_tolerance", type=float, default=-1, help="STATIC_FRAME_TOLERANCE, -1 disables it")
+    parser.add_argument("--colors_in_payload", type=int, default=10, help="COLORS_IN_PAYLOAD")
+    parser.add_argument("--delta_threshold", type=int, default=-1, help="DELTA_THRESHOLD, -1 sends every payload")
+    parser.add_argument("--keyframe_chunks", type=int, default=1, help="KEYFRAME_CHUNKS")
+    parser.add_argument("--output", type=str, default="", help="JSON file to write the results to, printed if empty")
+    commandlineargs = parser.parse_args()
+
+    if not os.path.exists(commandlineargs.file):
+        raise FileNotFoundError(f"Video file '{commandlineargs.file}' not found, record one first.")
+
+    # the stage timers of the ColorFactory and the Transmitter, with every duration kept for the percentiles
+    metrics.enable(keep_samples=True)
+    results = {
+        "file": commandlineargs.file,
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "runs": [],
+    }
+    for mode in commandlineargs.modes.split(","):
+        for leds in commandlineargs.leds.split(","):
+            horizontal_leds, vertical_leds = map(int, leds.lower().split("x"))
+            print(f"Replaying {mode} with {horizontal_leds}x{vertical_leds} LEDs..", file=sys.stderr)
+            # keep stdout clean for the JSON output
+            with contextlib.redirect_stdout(sys.stderr):
+                results["runs"].append(run(commandlineargs.file, mode, horizontal_leds, vertical_leds, commandlineargs))
+
+    output = json.dumps(results, indent=2)
+    if commandlineargs.output:
+        with open(commandlineargs.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
@@ -40,13 +40,10 @@ if __name__ == "__main__":
 
     try:
         while elapsed_time <= duration:
-            now = int(time.monotonic_ns() / 1000000)
-
-            now = time.time()
             strips = color_factory.test_strips()
-            # While statements is used because the no_acknowledge feature is turned on and some packages can go lost
-            while time.time() - now <= INTERVAL / 1000:
-                transmitter.update_receivers(strips)
+            # The colors are repeated because the no_acknowledge feature is turned on and some packages can go lost,
+            # repeat() sleeps between the broadcasts instead of keeping the CPU busy
+            transmitter.repeat(strips, INTERVAL / 1000)
             elapsed_time = time.time() - start_time
 
     except KeyboardInterrupt:
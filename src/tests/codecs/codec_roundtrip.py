@@ -0,0 +1,81 @@
+# this script serves debugging purposes only, no radio or Arduino is needed
+# it encodes chunks of colors with every codec of colorcodecs.py, decodes them again with the reference decoder
+# and checks that the colors survived within the precision of the codec
+# the lossless cases (RAW, PALETTE with at most 4 colors, RLE with at most 7 runs) must be exact
+# it also prints the error of every codec on smooth and random colors and the payloads a strip of --leds needs
+import sys
+import os
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(parent_dir)
+
+import argparse
+import numpy as np
+from colorcodecs import CODECS, PaletteCodec, RunLengthCodec, decode_payload
+from payload import PayloadEncoder
+
+
+def gradient(rng, count) -> np.ndarray:
+    start, end = rng.integers(0, 256, (2, 3))
+    return np.linspace(start, end, count).round().astype(np.uint8)
+
+
+def blocks(rng, count, block_count) -> np.ndarray:
+    colors = rng.integers(0, 256, (block_count, 3), dtype=np.uint8)
+    return colors[np.sort(rng.integers(0, block_count, count))]
+
+
+def rgb565_colors(rng, count) -> np.ndarray:
+    # colors of which the lowest bits repeat the highest bits, like the decoder restores them
+    blue, red = rng.integers(0, 32, (2, count))
+    green = rng.integers(0, 64, count)
+    return np.stack([blue << 3 | blue >> 2, green << 2 | green >> 4, red << 3 | red >> 2], axis=1).astype(np.uint8)
+
+
+def roundtrip(encoder, name, id, colors) -> np.ndarray:
+    payload = encoder.encode(id, 0, colors)
+    assert len(payload) <= 32, f"{name}: payload of {len(payload)} bytes"
+    decoded_id, offset, decoded = decode_payload(bytes(payload), encoder.COLORS_IN_PAYLOAD)
+    assert decoded_id == id and offset == 0, f"{name}: wrong header"
+    assert len(decoded) >= len(colors), f"{name}: {len(decoded)} colors decoded, {len(colors)} encoded"
+    return decoded[: len(colors)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200, help="Amount of random chunks per codec")
+    parser.add_argument("--colors_in_payload", type=int, default=10, help="COLORS_IN_PAYLOAD")
+    parser.add_argument("--leds", type=int, default=60, help="Amount of LEDs of the strip to count the payloads for")
+    commandlineargs = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = list(CODECS)
+    encoder = PayloadEncoder(commandlineargs.colors_in_payload, {id: name for id, name in enumerate(names, start=1)})
+
+    print(f"{'codec':8} {'colors':>6} {'payloads':>8} {'gradient error':>14} {'random error':>12}")
+    for id, name in enumerate(names, start=1):
+        capacity = encoder.colors_per_payload(id)
+        errors = {"gradient": [], "random": []}
+        for run in range(commandlineargs.runs):
+            count = int(rng.integers(1, capacity + 1))
+
+            # the cases every codec must decode exactly
+            exact = {"RAW": rng.integers(0, 256, (count, 3), dtype=np.uint8)}
+            exact["RGB565"] = rgb565_colors(rng, count)
+            exact["PALETTE"] = blocks(rng, count, min(count, PaletteCodec.palette_size))
+            exact["RLE"] = blocks(rng, count, min(count, RunLengthCodec.max_runs))
+            decoded = roundtrip(encoder, name, id, exact[name])
+            assert np.array_equal(decoded, exact[name]), f"{name} run {run}: lossless colors changed"
+
+            random_colors = rng.integers(0, 256, (count, 3), dtype=np.uint8)
+            for kind, colors in (("gradient", gradient(rng, count)), ("random", random_colors)):
+                decoded = roundtrip(encoder, name, id, colors)
+                errors[kind].append(np.abs(decoded.astype(np.int16) - colors).mean())
+
+        # RGB565 only drops the lowest bits, so it never is more than 7 off
+        if name == "RGB565":
+            assert max(errors["random"]) <= 7
+        payloads = -(-commandlineargs.leds // capacity)
+        print(
+            f"{name:8} {capacity:6} {payloads:8} {np.mean(errors['gradient']):14.2f} {np.mean(errors['random']):12.2f}"
+        )
+    print(f"All {commandlineargs.runs} chunks of every codec decoded as expected")
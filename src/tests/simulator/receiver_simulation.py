@@ -0,0 +1,105 @@
+# this script serves testing purposes only, no TV, capture device, radio or Arduino is needed
+# it replays a recorded video file through the ColorFactory and the Transmitter, with a virtual radio and a simulated
+# receiver (a Python model of arduino_receiver.ino) for every LedStrip
+# for every packet loss it reports how often the receivers show the colors of the current frame, how long they stay
+# out of date, and the frame rate the air time of the nRF24L01 allows
+# run it from the root of the repository
+import sys
+import os
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(parent_dir)
+
+import argparse
+import contextlib
+import json
+import cv2
+import numpy as np
+from colorfactory import ColorFactory
+from transmitter import Transmitter
+from virtualradio import VirtualRadio
+from receiver import Receiver
+from scheduler import PacketScheduler
+
+
+def simulate(file: str, loss: float, args) -> dict:
+    color_factory = ColorFactory(args.horizontal_leds, args.vertical_leds, "AVERAGE")
+    radio = VirtualRadio(loss, seed=args.seed)
+    receivers = [Receiver(strip.id, args.colors_in_payload, strip.led_count) for strip in color_factory.get_strips()]
+    for receiver in receivers:
+        radio.attach(receiver)
+    strip_codecs = {strip.id: args.codec for strip in color_factory.get_strips()}
+    transmitter = Transmitter(
+        args.colors_in_payload, args.delta_threshold, args.keyframe_chunks, radio, STRIP_CODECS=strip_codecs
+    )
+
+    vc = cv2.VideoCapture(file)
+    fps = vc.get(cv2.CAP_PROP_FPS) or 30
+    frames, converged_frames, duration = 0, 0, 0.0
+    # the budget of the scheduler runs on the simulated time instead of the (much faster) time of the replay
+    transmitter.scheduler = PacketScheduler(args.packets_per_second, clock=lambda: duration)
+    errors = []
+    stale_frames, longest_stale = 0, 0
+    while len(errors) < args.frames or args.frames < 0:
+        rval, frame = vc.read()
+        if not rval:
+            break
+        airtime = radio.airtime
+        _, led_strips = color_factory.calculate_colors(frame)
+        transmitter.update_receivers(led_strips)
+
+        # the frame can't be sent faster than the radio allows
+        duration += max(1 / fps, radio.airtime - airtime)
+        error = max(
+            int(np.abs(receiver.colors.astype(np.int16) - strip.colors).max())
+            for receiver, strip in zip(receivers, led_strips)
+        )
+        errors.append(error)
+        frames += 1
+        # in delta mode a difference up to the DELTA_THRESHOLD is not sent on purpose
+        if error <= max(args.delta_threshold, 0):
+            converged_frames += 1
+            stale_frames = 0
+        else:
+            stale_frames += 1
+            longest_stale = max(longest_stale, stale_frames)
+    vc.release()
+
+    return {
+        "loss": loss,
+        "frames": frames,
+        "payloads_sent": radio.sent,
+        "receptions_lost": radio.lost,  # every receiver misses payloads on its own
+        "airtime_per_frame_ms": radio.airtime / frames * 1000 if frames > 0 else 0,
+        "airtime_limited_fps": frames / radio.airtime if radio.airtime > 0 else 0,
+        "delivered_fps": converged_frames / duration if duration > 0 else 0,
+        "converged_fraction": converged_frames / frames if frames > 0 else 0,
+        "mean_error": float(np.mean(errors)) if errors else 0,
+        "longest_stale_frames": longest_stale,
+        "max_chunk_staleness_ms": transmitter.scheduler.max_staleness * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, default="video.mp4", help="Video file to replay")
+    parser.add_argument("--losses", type=str, default="0,0.05,0.2", help="Comma separated packet loss probabilities")
+    parser.add_argument("--frames", type=int, default=-1, help="Maximum amount of frames per run, -1 replays the whole file")
+    parser.add_argument("--horizontal_leds", type=int, default=10, help="HORIZONTAL_LEDS")
+    parser.add_argument("--vertical_leds", type=int, default=10, help="VERTICAL_LEDS")
+    parser.add_argument("--colors_in_payload", type=int, default=10, help="COLORS_IN_PAYLOAD")
+    parser.add_argument("--delta_threshold", type=int, default=-1, help="DELTA_THRESHOLD, -1 sends every payload")
+    parser.add_argument("--keyframe_chunks", type=int, default=1, help="KEYFRAME_CHUNKS")
+    parser.add_argument("--packets_per_second", type=float, default=-1, help="PACKETS_PER_SECOND, -1 disables the limit")
+    parser.add_argument("--codec", type=str, default="RAW", help="Codec of every strip: RAW, RGB565, PALETTE or RLE")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the packet loss")
+    commandlineargs = parser.parse_args()
+
+    if not os.path.exists(commandlineargs.file):
+        raise FileNotFoundError(f"Video file '{commandlineargs.file}' not found, record one first.")
+
+    results = []
+    for loss in commandlineargs.losses.split(","):
+        # keep stdout clean for the JSON output
+        with contextlib.redirect_stdout(sys.stderr):
+            results.append(simulate(commandlineargs.file, float(loss), commandlineargs))
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,160 @@
+# this script serves debugging purposes only, no model or camera is needed
+# it checks that the vectorized YOLO_ONNXRuntime_Detect.get_best_boxes returns the same boxes as the original per-row loop
+# random model outputs are generated with clusters of overlapping boxes, so the NMS has something to suppress
+# outputs with few clusters keep less than n boxes in the first chunk of the NMS, so the later chunks are checked too
+# it also prints the peak memory of one NMS over all candidates of an output without clusters
+import sys
+import os
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(parent_dir)
+
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from yolo_onnxruntime import YOLO_ONNXRuntime_Detect
+from utils import Letterbox, xywh2xyxy, scale_boxes, nms
+
+
+def nms_loop(boxes, scores, nms_threshold):
+    # the original NMS, suppressing boxes one kept box at a time
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = boxes[:, 2]
+    y2 = boxes[:, 3]
+    areas = (y2 - y1 + 1) * (x2 - x1 + 1)
+    keep = []
+    index = scores.argsort()[::-1]
+
+    while index.size > 0:
+        i = index[0]
+        keep.append(i)
+        x11 = np.maximum(x1[i], x1[index[1:]])
+        y11 = np.maximum(y1[i], y1[index[1:]])
+        x22 = np.minimum(x2[i], x2[index[1:]])
+        y22 = np.minimum(y2[i], y2[index[1:]])
+        w = np.maximum(0, x22 - x11 + 1)
+        h = np.maximum(0, y22 - y11 + 1)
+        overlaps = w * h
+        ious = overlaps / (areas[i] + areas[index[1:]] - overlaps)
+        idx = np.where(ious <= nms_threshold)[0]
+        index = index[idx + 1]
+    return keep
+
+
+def get_best_boxes_loop(detector, n, image):
+    # the original post-processing, looping over every row of the model output
+    output = np.squeeze(detector.outputs[0]).astype(dtype=np.float32)
+    boxes = []
+    scores = []
+
+    output = output.T
+    classes_scores = output[..., 4 : (4 + detector.class_num)]
+
+    for i in range(output.shape[0]):
+        class_id = np.argmax(classes_scores[i])
+        score = classes_scores[i][class_id]
+        if score > detector.confidence_threshold:
+            boxes.append(np.concatenate([output[i, :4], np.array([score, class_id])]))
+            scores.append(score)
+
+    if len(boxes):
+        boxes = xywh2xyxy(np.array(boxes))
+        scores = np.array(scores)
+        indices = nms_loop(boxes, scores, detector.nms_threshold)
+        boxes = scale_boxes(boxes[indices], detector.inputs_shape, image.shape)
+        scores = scores[indices]
+        if len(boxes) >= n:
+            return boxes[np.argsort(scores)[::-1][:n]]
+    return np.array([])
+
+
+def random_output(rng, class_num, anchors, clusters) -> np.ndarray:
+    centers = rng.uniform(20, 300, (clusters, 2))
+    cluster = rng.integers(0, clusters, anchors)
+    xy = centers[cluster] + rng.normal(0, 4, (anchors, 2))
+    wh = rng.uniform(10, 30, (anchors, 2))
+    scores = rng.uniform(0, 0.5, (anchors, class_num)) ** 2
+    return np.concatenate([xy, wh, scores], axis=1).T[np.newaxis].astype(np.float32)
+
+
+def few_boxes_output(rng, class_num, anchors, clusters) -> np.ndarray:
+    # the best scoring anchors are in a few tight clusters that suppress each other, like missing hearts,
+    # the rest are spread out with scores just above the confidence threshold
+    output = random_output(rng, class_num, anchors, clusters)
+    clustered = anchors * 3 // 4
+    centers = rng.uniform(20, 300, (clusters, 2))
+    output[0, :2, :clustered] = (centers[rng.integers(0, clusters, clustered)] + rng.normal(0, 1, (clustered, 2))).T
+    output[0, 2:4, :clustered] = 20
+    output[0, 4:, :clustered] = rng.uniform(0.5, 1, (class_num, clustered))
+    output[0, :2, clustered:] = rng.uniform(20, 300, (2, anchors - clustered))
+    output[0, 4:, clustered:] = rng.uniform(0.1, 0.2, (class_num, anchors - clustered))
+    return output
+
+
+def candidates(detector) -> tuple[np.ndarray, np.ndarray]:
+    # boxes (xyxy) and scores of the candidates above the confidence threshold
+    output = np.squeeze(detector.outputs[0]).T
+    scores = output[:, 4 : 4 + detector.class_num].max(axis=1)
+    mask = scores > detector.confidence_threshold
+    return xywh2xyxy(output[mask, :4].astype(np.float64)), scores[mask]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200, help="Amount of random model outputs to compare")
+    commandlineargs = parser.parse_args()
+
+    # only the attributes used by get_best_boxes are needed, so no onnx model is loaded
+    detector = YOLO_ONNXRuntime_Detect.__new__(YOLO_ONNXRuntime_Detect)
+    detector.class_num = 3
+    detector.nms_threshold = 0.5
+    detector.confidence_threshold = 0.1
+    detector.inputs_shape = (320, 320)
+    detector.letterbox = Letterbox(detector.inputs_shape)
+
+    rng = np.random.default_rng(0)
+    image = np.zeros((120, 400, 3), dtype=np.uint8)
+    loop_time, vectorized_time = 0, 0
+    later_chunks = 0  # runs of which the first chunk of the NMS kept less than n boxes
+    for run in range(commandlineargs.runs):
+        # every other run has less clusters than the 10 hearts, like a healthbar that is not (fully) visible
+        if run % 2:
+            detector.outputs = [few_boxes_output(rng, detector.class_num, 2100, rng.integers(1, 10))]
+        else:
+            detector.outputs = [random_output(rng, detector.class_num, 2100, rng.integers(1, 40))]
+        n = int(rng.integers(1, 15))
+
+        boxes, scores = candidates(detector)
+        if len(nms(boxes, scores, detector.nms_threshold, limit=n, chunk_size=300)) == n:
+            top = scores.argsort()[::-1][:300]
+            if len(nms(boxes[top], scores[top], detector.nms_threshold)) < n:
+                later_chunks += 1
+
+        start = time.perf_counter()
+        expected = get_best_boxes_loop(detector, n, image)
+        loop_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = detector.get_best_boxes(n, image)
+        vectorized_time += time.perf_counter() - start
+
+        assert result.shape == expected.shape, f"run {run}: {result.shape} != {expected.shape}"
+        # boxes with exactly the same score can be in any order
+        if len(expected):
+            result, expected = result[np.lexsort(result.T)], expected[np.lexsort(expected.T)]
+        assert np.allclose(result, expected), f"run {run}: different boxes"
+
+    print(f"All {commandlineargs.runs} outputs gave the same boxes, {later_chunks} needed more than one NMS chunk")
+
+    # one box per anchor far apart from each other, nothing is suppressed so every chunk is used
+    detector.outputs = [random_output(rng, detector.class_num, 2100, 2100)]
+    detector.outputs[0][0, 4:] = 0.9
+    boxes, scores = candidates(detector)
+    tracemalloc.start()
+    indices = nms(boxes, scores, detector.nms_threshold)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"NMS of {len(scores)} candidates ({len(indices)} kept): peak memory {peak / 1e6:.1f} MB")
+    print(f"Loop:       {loop_time / commandlineargs.runs * 1000:8.2f} ms")
+    print(f"Vectorized: {vectorized_time / commandlineargs.runs * 1000:8.2f} ms")
@@ -0,0 +1,102 @@
+# this script serves debugging purposes only, no model or camera is needed
+# it checks that the persistent Letterbox of utils.py gives the same input tensor as the original letterbox() function,
+# and that cv2.resize really writes into the (non-contiguous) region of the persistent image instead of a new image
+# it also counts how often the letterbox geometry is calculated again for the hearts crops of a healthbar that moves a
+# few pixels every frame, with and without snapping the crops to ColorFactory.crop_step
+# and it checks that snapped crops near the edges of the frame and of the content area (letterboxed video) stay inside
+# them and still contain the healthbar
+import sys
+import os
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(parent_dir)
+
+import argparse
+import cv2
+import numpy as np
+from utils import Letterbox, letterbox, snap_crop
+from colorfactory import ColorFactory
+
+
+def reference_tensor(image, new_shape) -> np.ndarray:
+    # the original pre-processing: letterbox, BGR2RGB, HWC2CHW and normalization as separate steps
+    image = letterbox(image, new_shape)
+    image = image[:, :, ::-1].transpose(2, 0, 1)
+    return (image / 255.0)[np.newaxis].astype(np.float32)
+
+
+class CountingLetterbox(Letterbox):
+    # counts the calculations of the geometry
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.computes = 0
+
+    def compute(self, shape) -> None:
+        self.computes += 1
+        super().compute(shape)
+
+
+def hearts_crop(x1, y1, x2, y2, bounds, snap, previous) -> tuple[int, int, int, int]:
+    # the same crop as ColorFactory.detect_health_color
+    half_width = int((x2 - x1) / 2)
+    top, left = max(y2 - half_width * 2 - 10, 0), max(x1 - 10, 0)
+    if snap:
+        return snap_crop(top, left, y2 + 10, x2 + 10, bounds, ColorFactory.crop_step, previous)
+    return top, left, y2 + 10, x2 + 10
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=1000, help="Amount of frames of the moving healthbar")
+    commandlineargs = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    new_shape = (320, 320)
+    shapes = [(100, 400), (400, 100), (320, 320), (200, 200), (57, 333), (1080, 1920)]
+    for shape in shapes:
+        image = rng.integers(0, 256, shape + (3,), dtype=np.uint8)
+        persistent = Letterbox(new_shape)
+        tensor = persistent(image)
+        assert np.allclose(tensor, reference_tensor(image, new_shape)), f"{shape}: different tensor"
+
+        # the resize must write into the region of the persistent image, not into a new image
+        if shape != new_shape:
+            resized = cv2.resize(image, persistent.new_unpad, dst=persistent.region, interpolation=cv2.INTER_LINEAR)
+            assert resized is persistent.region, f"{shape}: cv2.resize allocated a new image"
+            assert np.shares_memory(resized, persistent.image), f"{shape}: resized image is not a view"
+        print(f"{str(shape):12} region contiguous: {persistent.region.flags['C_CONTIGUOUS']!s:5}, same tensor")
+
+    # a healthbar of about 400 x 40 pixels in a 1080p frame, refined every frame by a few pixels
+    frame_shape = (1080, 1920, 3)
+    frame_bounds = (0, 0, 1080, 1920)
+    box = np.array([760, 980, 1160, 1020])
+    for snap in (False, True):
+        persistent = CountingLetterbox(new_shape)
+        previous = None
+        for frame in range(commandlineargs.frames):
+            x1, y1, x2, y2 = box + rng.integers(-3, 4, 4)
+            top, left, bottom, right = hearts_crop(x1, y1, x2, y2, frame_bounds, snap, previous)
+            assert top <= y2 - int((x2 - x1) / 2) * 2 - 10 and bottom >= y2 + 10, "the crop lost a part of the hearts"
+            assert left <= x1 - 10 and right >= x2 + 10, "the crop lost a part of the hearts"
+            previous = (bottom - top, right - left)
+            persistent(np.zeros((bottom - top, right - left, 3), dtype=np.uint8))
+        print(f"Snapped crops: {snap!s:5}, geometry calculated {persistent.computes} times in {commandlineargs.frames} frames")
+
+    # healthbars at the edges of the frame and of a letterboxed content area, the crop must stay inside the bounds and
+    # contain the part of the healthbar (with its margin) inside them
+    checked = 0
+    for bounds in (frame_bounds, (140, 0, 940, 1920), (0, 240, 1080, 1680)):
+        bounds_top, bounds_left, bounds_bottom, bounds_right = bounds
+        previous = None
+        for frame in range(commandlineargs.frames):
+            width = int(rng.integers(40, 400))
+            x1 = int(rng.integers(bounds_left - 20, bounds_right - width + 20))
+            y2 = int(rng.integers(bounds_top + width // 4, bounds_bottom + 20))
+            top, left, bottom, right = hearts_crop(x1, y2 - width // 10, x1 + width, y2, bounds, True, previous)
+            assert bounds_top <= top and bottom <= bounds_bottom, f"{bounds}: crop rows {top}:{bottom} outside the bounds"
+            assert bounds_left <= left and right <= bounds_right, f"{bounds}: crop columns {left}:{right} outside the bounds"
+            half_width = int(width / 2)
+            assert top <= max(y2 - half_width * 2 - 10, bounds_top) and bottom >= min(y2 + 10, bounds_bottom)
+            assert left <= max(x1 - 10, bounds_left) and right >= min(x1 + width + 10, bounds_right)
+            previous = (bottom - top, right - left)
+            checked += 1
+    print(f"{checked} snapped crops at the edges stayed inside the frame and the content area")
@@ -7,15 +7,68 @@ Based on https://nRF24.github.io/pyRF24
 # Suppose that the COLORS_IN_PAYLOAD is 10, then the payload will be exactly 10 colors. 
 # If the horizontal_count is set on 25, the broadcaster will have to split that over 3 payloads for the same id, with 3 different offsets.
 # The Arduino's will act upon these ids and offsets and only update the relevant pixels on the LED strips.
+# In delta mode only the chunks (id + offset) of which the colors changed are sent out, plus a few unchanged chunks every
+# update in round robin order (keyframes). Payloads can get lost, so the keyframes make sure all receivers converge.
+# The chunks are handed to the PacketScheduler, which keeps the payloads within the budget of the radio and lets the strips
+# take turns.
 
-import struct
-from pyrf24 import RF24, RF24_DRIVER, RF24_1MBPS, RF24_2MBPS, RF24_250KBPS, RF24_PA_HIGH, RF24_PA_LOW
+import time
+import numpy as np
 from ledstrip import LedStrip
+from payload import PayloadEncoder
+from scheduler import PacketScheduler
+from metrics import metrics
 
 
 class Transmitter:
-    def __init__(self, COLORS_IN_PAYLOAD: int) -> None:
+    # seconds between two broadcasts of the same colors in repeat()
+    repeat_interval = 0.01
+
+    def __init__(
+        self,
+        COLORS_IN_PAYLOAD: int,
+        DELTA_THRESHOLD: int = -1,
+        KEYFRAME_CHUNKS: int = 1,
+        radio=None,
+        PACKETS_PER_SECOND: float = -1,
+        STRIP_WEIGHTS: dict = None,
+        STRIP_CODECS: dict = None,
+    ) -> None:
+        """
+        Initialize the transmitter.
+
+        Args:
+            COLORS_IN_PAYLOAD (int): Amount of colors in every payload.
+            DELTA_THRESHOLD (int): Only send chunks of which a color value changed more than this, negative sends every chunk.
+            KEYFRAME_CHUNKS (int): Amount of unchanged chunks to send anyway every update, in turns.
+            radio: Object with the write(buffer, multicast) and power of a pyrf24 RF24, the nRF24L01 is used if None.
+            PACKETS_PER_SECOND (float): Maximum amount of payloads per second, 0 or negative doesn't limit the payloads.
+            STRIP_WEIGHTS (dict): Id of the LedStrip -> share of the payloads it gets when the budget is limited.
+            STRIP_CODECS (dict): Id of the LedStrip -> name of the codec its payloads are encoded with, RAW by default.
+        """
         self.COLORS_IN_PAYLOAD = COLORS_IN_PAYLOAD
+        self.DELTA_THRESHOLD = DELTA_THRESHOLD  # negative disables delta mode
+        self.KEYFRAME_CHUNKS = KEYFRAME_CHUNKS
+        self.encoder = PayloadEncoder(COLORS_IN_PAYLOAD, STRIP_CODECS)
+        self.scheduler = PacketScheduler(PACKETS_PER_SECOND, STRIP_WEIGHTS)
+
+        self.last_sent = {}  # (id, offset) -> colors of the last payload sent for that chunk
+        self.keyframe_cursor = 0
+
+        self.radio = radio if radio is not None else self.create_radio()
+
+    @staticmethod
+    def create_radio(CE_PIN: int = -1, CSN_PIN: int = 0, CHANNEL: int = 90):
+        """
+        Initialize a nRF24L01, multiple radios need their own CE pin and CSN pin (or SPI bus).
+
+        Args:
+            CE_PIN (int): CE pin in the numbering of the driver, negative uses GPIO22.
+            CSN_PIN (int): SPI bus and chip select, see below.
+            CHANNEL (int): Channel to broadcast on, the receivers must listen on the same channel.
+        """
+        # pyrf24 is only needed for the real nRF24L01
+        from pyrf24 import RF24, RF24_DRIVER, RF24_2MBPS, RF24_PA_HIGH
 
         ########### USER CONFIGURATION ###########
         # CE Pin uses GPIO number with RPi and SPIDEV drivers, other drivers use
@@ -23,52 +76,113 @@ class Transmitter:
         # CS Pin corresponds the SPI bus number at /dev/spidev<a>.<b>
         # ie: radio = RF24(<ce_pin>, <a>*10+<b>)
         # where CS pin for /dev/spidev1.0 is 10, /dev/spidev1.1 is 11 etc...
-        CSN_PIN = 0  # aka CE0 on SPI bus 0: /dev/spidev0.0
-        if RF24_DRIVER == "MRAA":
-            CE_PIN = 15  # for GPIO22
-        elif RF24_DRIVER == "wiringPi":
-            CE_PIN = 3  # for GPIO22
-        else:
-            CE_PIN = 22
-        self.radio = RF24(CE_PIN, CSN_PIN)
+        # CSN_PIN 0 is aka CE0 on SPI bus 0: /dev/spidev0.0
+        if CE_PIN < 0:
+            if RF24_DRIVER == "MRAA":
+                CE_PIN = 15  # for GPIO22
+            elif RF24_DRIVER == "wiringPi":
+                CE_PIN = 3  # for GPIO22
+            else:
+                CE_PIN = 22
+        radio = RF24(CE_PIN, CSN_PIN)
 
         # initialize the nRF24L01 on the spi bus
-        if not self.radio.begin():
+        if not radio.begin():
             raise OSError("nRF24L01 hardware isn't responding")
 
         # Configure radio
-        self.radio.setAutoAck(False)  # Disable acknowledgment
-        self.radio.channel = 90  # Set communication channel
-        self.radio.setDataRate(RF24_2MBPS)  # Set data rate
-        self.radio.openWritingPipe(0xF0F0F0F0E1)  # Use a broadcast address
-        self.radio.setPALevel(RF24_PA_HIGH)  # Power level: low for closer range, high for further range
-
-        self.radio.print_pretty_details()
+        radio.setAutoAck(False)  # Disable acknowledgment
+        radio.channel = CHANNEL  # Set communication channel
+        radio.setDataRate(RF24_2MBPS)  # Set data rate
+        radio.openWritingPipe(0xF0F0F0F0E1)  # Use a broadcast address
+        radio.setPALevel(RF24_PA_HIGH)  # Power level: low for closer range, high for further range
 
-    def create_payload(self, id, offset, colors) -> bytes:
-        color_data = colors.flatten().tolist()  # Flatten the (x, 3) array to 1D
+        radio.print_pretty_details()
+        return radio
 
-        if len(color_data) < self.COLORS_IN_PAYLOAD * 3:
-            color_data.extend([0] * (self.COLORS_IN_PAYLOAD * 3 - len(color_data)))
+    def create_payload(self, id, offset, colors) -> memoryview:
+        # Write the colors into the preallocated payload of this chunk
+        return self.encoder.encode(id, offset, colors)
 
-        payload_integers = [id, offset] + [int(value) for value in color_data]
+    def send_chunk(self, id, offset, chunk) -> None:
+        payload_data = self.create_payload(id, offset, chunk)
 
-        # Pack the data as integers into byte format
-        return struct.pack(f"{len(payload_integers)}B", *payload_integers)
-
-    def send_colors_in_chunks(self, colors, id) -> None:
-        total_colors = colors.shape[0]
-
-        for offset in range(0, total_colors, self.COLORS_IN_PAYLOAD):
-            chunk = colors[offset : offset + self.COLORS_IN_PAYLOAD]
-            payload_data = self.create_payload(id, offset, chunk)
-
-            # Send the payload
+        # Send the payload
+        with metrics.timer("radio_write"):
             self.radio.write(payload_data, multicast=True)
+        metrics.increment("payloads_sent")
 
-    def update_receivers(self, led_strips: list[LedStrip]) -> None:
+    def is_changed(self, id, offset, chunk) -> bool:
+        last = self.last_sent.get((id, offset))
+        if last is None or last.shape != chunk.shape:
+            return True
+        return np.abs(np.subtract(chunk, last, dtype=np.int16)).max() > self.DELTA_THRESHOLD
+
+    def get_chunks(self, led_strips: list[LedStrip]) -> list[tuple[int, int, np.ndarray]]:
+        chunks = []
         for strip in led_strips:
-            self.send_colors_in_chunks(strip.colors, id=strip.id)
+            # the codec of the strip decides how many colors fit in a payload
+            size = self.encoder.colors_per_payload(strip.id)
+            for offset in range(0, strip.colors.shape[0], size):
+                chunks.append((strip.id, offset, strip.colors[offset : offset + size]))
+        return chunks
+
+    def update_receivers(self, led_strips: list[LedStrip], force: bool = False) -> None:
+        """
+        Queue the chunks of the strips and send what fits in the budget.
+
+        Args:
+            led_strips (list[LedStrip]): Strips to send the colors of.
+            force (bool): Queue every chunk, also the ones that didn't change in delta mode.
+        """
+        chunks = self.get_chunks(led_strips)
+        delta = self.DELTA_THRESHOLD >= 0
+
+        if not delta or force:
+            for chunk in chunks:
+                self.scheduler.enqueue(*chunk)
+        else:
+            # Queue the chunks that changed since they were last sent
+            queued = [False] * len(chunks)
+            for index, (id, offset, chunk) in enumerate(chunks):
+                if self.is_changed(id, offset, chunk):
+                    self.scheduler.enqueue(id, offset, chunk)
+                    queued[index] = True
+
+            # Refresh a few of the unchanged chunks, continuing where the previous update stopped
+            refreshed = 0
+            for _ in range(len(chunks)):
+                if refreshed >= self.KEYFRAME_CHUNKS:
+                    break
+                index = self.keyframe_cursor % len(chunks)
+                self.keyframe_cursor = index + 1
+                id, offset, chunk = chunks[index]
+                if not queued[index] and not self.scheduler.is_pending(id, offset):
+                    self.scheduler.enqueue(id, offset, chunk)
+                    refreshed += 1
+
+        for id, offset, chunk in self.scheduler.next_chunks():
+            self.send_chunk(id, offset, chunk)
+            if delta:
+                self.last_sent[(id, offset)] = chunk.copy()
+
+    def repeat(self, led_strips: list[LedStrip], seconds: float) -> None:
+        """
+        Broadcast the same colors for a while. Acknowledgements are disabled and payloads can get lost, so a single
+        broadcast is not enough for colors that must arrive (errors, shutdown).
+
+        Args:
+            led_strips (list[LedStrip]): Strips to send the colors of.
+            seconds (float): Duration of the repeats.
+        """
+        end_time = time.perf_counter() + seconds
+        interval = max(Transmitter.repeat_interval, self.scheduler.interval(len(self.get_chunks(led_strips))))
+        while True:
+            self.update_receivers(led_strips, force=True)
+            remaining = end_time - time.perf_counter()
+            if remaining <= 0:
+                return
+            time.sleep(min(interval, remaining))
 
     def close(self) -> None:
         self.radio.power = False
@@ -7,30 +7,53 @@ description:                Non-Maximum Suppression
 param {*} boxes             detect bounding boxes
 param {*} scores            detect scores
 param {*} nms_threshold     IOU threshold
-return {*}                  detect indices
+param {*} limit             stop after this amount of kept boxes, None keeps all
+param {*} chunk_size        amount of boxes of which the IOUs are calculated at once
+return {*}                  detect indices, sorted by descending score
 '''
-def nms(boxes, scores, nms_threshold):
+def nms(boxes, scores, nms_threshold, limit=None, chunk_size=300):
     x1 = boxes[:, 0]
     y1 = boxes[:, 1]
     x2 = boxes[:, 2]
     y2 = boxes[:, 3]
     areas = (y2 - y1 + 1) * (x2 - x1 + 1)
-    keep = []
-    index = scores.argsort()[::-1] 
-
-    while index.size > 0:
-        i = index[0]
-        keep.append(i)
-        x11 = np.maximum(x1[i], x1[index[1:]]) 
-        y11 = np.maximum(y1[i], y1[index[1:]])
-        x22 = np.minimum(x2[i], x2[index[1:]])
-        y22 = np.minimum(y2[i], y2[index[1:]])
-        w = np.maximum(0, x22 - x11 + 1)                              
-        h = np.maximum(0, y22 - y11 + 1) 
+
+    # The boxes are suppressed in chunks in score order, so at most (kept boxes + chunk_size) x chunk_size IOUs are in
+    # memory at once. Every chunk is the best chunk_size of the boxes that are left (argpartition), only the chunk is
+    # sorted, and the chunks after the limit is reached are never looked at.
+    # This gives exactly the same boxes as suppressing them one kept box at a time over all boxes.
+    keep = np.zeros(0, dtype=np.intp)
+    remaining = np.arange(scores.size)
+    while remaining.size:
+        if remaining.size > chunk_size:
+            best = np.argpartition(-scores[remaining], chunk_size - 1)
+            chunk, remaining = remaining[best[:chunk_size]], remaining[best[chunk_size:]]
+        else:
+            chunk, remaining = remaining, remaining[:0]
+        chunk = chunk[np.argsort(-scores[chunk], kind="stable")]
+        others = np.concatenate([keep, chunk])
+
+        # suppressed[i, j] is True when box i (a kept box of an earlier chunk or a box of this chunk) overlaps box j
+        w = np.maximum(0, np.minimum(x2[others, None], x2[chunk]) - np.maximum(x1[others, None], x1[chunk]) + 1)
+        h = np.maximum(0, np.minimum(y2[others, None], y2[chunk]) - np.maximum(y1[others, None], y1[chunk]) + 1)
         overlaps = w * h
-        ious = overlaps / (areas[i] + areas[index[1:]] - overlaps)
-        idx = np.where(ious <= nms_threshold)[0]
-        index = index[idx + 1]
+        suppressed = overlaps / (areas[others, None] + areas[chunk] - overlaps) > nms_threshold
+
+        # boxes suppressed by the kept boxes of earlier chunks are out, within the chunk a box can only be suppressed
+        # by a box with a higher score that is kept itself: starting from all boxes, the boxes that are not suppressed
+        # by the alive boxes before them are found again until nothing changes, which ends with the greedy result
+        candidates = ~suppressed[: keep.size].any(axis=0)
+        suppressed = np.triu(suppressed[keep.size :], k=1).astype(np.float32)  # float for a BLAS matrix-vector product
+        alive = candidates
+        while True:
+            next_alive = candidates & (alive.astype(np.float32) @ suppressed == 0)
+            if np.array_equal(next_alive, alive):
+                break
+            alive = next_alive
+
+        keep = np.concatenate([keep, chunk[alive]])
+        if limit is not None and keep.size >= limit:
+            return keep[:limit]
     return keep
 
 
@@ -74,6 +97,95 @@ def letterbox(im, new_shape=(416, 416), color=(114, 114, 114)):
     return im
 
 
+'''
+description:            letterbox image process writing into a persistent buffer
+                        the scale and padding are only calculated again when the shape of the input image changes
+                        the image is resized straight into a persistent letterboxed image, of which the padding is filled once
+                        that image is converted to a normalized RGB NCHW tensor in one pass, without temporary arrays
+param {*} new_shape     output shape
+param {*} out           (1, 3, height, width) float buffer to write the tensor into, allocated if None
+param {*} color         filled color
+'''
+class Letterbox():
+    def __init__(self, new_shape=(416, 416), out=None, color=(114, 114, 114)):
+        self.new_shape = new_shape
+        self.color = color
+        self.out = out if out is not None else np.zeros((1, 3, new_shape[0], new_shape[1]), dtype=np.float32)
+        self.divisor = self.out.dtype.type(255.0)
+        self.image = np.zeros((new_shape[0], new_shape[1], 3), dtype=np.uint8)
+        self.shape = None
+
+    def compute(self, shape):
+        # Same geometry as letterbox()
+        r = min(self.new_shape[0] / shape[0], self.new_shape[1] / shape[1])
+        self.new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+        dw, dh = (self.new_shape[1] - self.new_unpad[0])/2, (self.new_shape[0] - self.new_unpad[1])/2
+        top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+        self.image[:] = self.color
+        self.region = self.image[top:top + self.new_unpad[1], left:left + self.new_unpad[0]]
+
+        # Same inverse transform as scale_boxes()
+        self.gain = min(self.new_shape[0] / shape[0], self.new_shape[1] / shape[1])
+        self.pad = (self.new_shape[1] - shape[1] * self.gain) / 2, (self.new_shape[0] - shape[0] * self.gain) / 2
+        self.shape = shape
+
+    def __call__(self, im):
+        if im.shape[:2] != self.shape:
+            self.compute(im.shape[:2])
+        if im.shape[1::-1] != self.new_unpad:  # resize
+            resized = cv2.resize(im, self.new_unpad, dst=self.region, interpolation=cv2.INTER_LINEAR)
+            if resized is not self.region:
+                # OpenCV allocated a new image instead of writing into the (non-contiguous) region
+                np.copyto(self.region, resized)
+        else:
+            np.copyto(self.region, im)
+        # BGR2RGB, HWC2CHW and normalization in one pass
+        np.divide(self.image[:, :, ::-1].transpose(2, 0, 1), self.divisor, out=self.out[0])
+        return self.out
+
+    def scale_boxes(self, boxes):
+        # Rescale boxes (xyxy) from self.new_shape to the shape of the last image
+        boxes[..., [0, 2]] -= self.pad[0]  # x padding
+        boxes[..., [1, 3]] -= self.pad[1]  # y padding
+        boxes[..., :4] /= self.gain
+        boxes[..., [0, 2]] = boxes[..., [0, 2]].clip(0, self.shape[1])  # x1, x2
+        boxes[..., [1, 3]] = boxes[..., [1, 3]].clip(0, self.shape[0])  # y1, y2
+        return boxes
+
+
+'''
+description:            grow a crop to a stable size, so crops of about the same size get exactly the same size
+                        the size of the previous crop is kept while the crop fits in it and is less than 2 steps smaller,
+                        otherwise the height and width are rounded up to a multiple of step
+                        the crop grows equally on both sides, and is moved back inside the bounds at their edges
+param {*} top           top of the crop
+param {*} left          left of the crop
+param {*} bottom        bottom of the crop (exclusive)
+param {*} right         right of the crop (exclusive)
+param {*} bounds        top, left, bottom, right (exclusive) of the part of the image the crop must stay in
+param {*} step          the height and width of the crop are rounded up to a multiple of this
+param {*} previous      (height, width) of the previous crop, None rounds up
+return {*}              top, left, bottom, right of the grown crop, which contains the original crop within the bounds
+'''
+def snap_crop(top, left, bottom, right, bounds, step, previous=None):
+    bounds_top, bounds_left, bounds_bottom, bounds_right = bounds
+    top, left = max(top, bounds_top), max(left, bounds_left)
+    bottom, right = min(bottom, bounds_bottom), min(right, bounds_right)
+    crop = []
+    for start, end, previous_size, bounds_start, bounds_end in (
+        (top, bottom, previous[0] if previous else None, bounds_top, bounds_bottom),
+        (left, right, previous[1] if previous else None, bounds_left, bounds_right),
+    ):
+        needed = max(end - start, 1)
+        if previous_size is None or not 0 <= previous_size - needed < 2 * step:
+            previous_size = -(-needed // step) * step
+        size = min(previous_size, bounds_end - bounds_start)
+        start = min(max(start - (size - needed) // 2, bounds_start), bounds_end - size)
+        crop.append((start, start + size))
+    (top, bottom), (left, right) = crop
+    return top, left, bottom, right
+
+
 '''
 description:            scale boxes
 param {*} boxes         bounding boxes
@@ -0,0 +1,75 @@
+# This class stands in for the nRF24L01, so the transmitter can run without pyrf24 or any hardware attached.
+# Every payload is broadcasted to the attached receivers (see receiver.py), each receiver can lose it with the given probability.
+# The air time of every payload is calculated like the nRF24L01 sends it (Enhanced ShockBurst without acknowledgements).
+# In realtime mode write() waits until the previous payload left the air, so the transmitter can't send faster than the real radio.
+
+import random
+import time
+
+
+class VirtualRadio:
+    payload_size = 32  # static payload size of the nRF24L01, shorter payloads are padded
+    settling_seconds = 130e-6  # time the nRF24L01 needs to switch on its transmitter
+    overhead_bits = 8 * (1 + 5 + 2) + 9  # preamble, address, CRC and packet control field
+
+    def __init__(self, loss: float = 0.0, data_rate: int = 2_000_000, realtime: bool = False, seed: int = None) -> None:
+        """
+        Initialize the virtual radio.
+
+        Args:
+            loss (float): Probability (0 - 1) that a receiver misses a payload, every receiver is drawn independently.
+            data_rate (int): Bits per second, the transmitter uses RF24_2MBPS.
+            realtime (bool): Wait in write() until the previous payload is sent, like the real radio.
+            seed (int): Seed of the packet loss, None gives a different loss pattern every run.
+        """
+        self.loss = loss
+        self.data_rate = data_rate
+        self.realtime = realtime
+        self.random = random.Random(seed)
+        self.power = True
+        self.receivers = []
+
+        self.busy_until = 0.0  # time.perf_counter() at which the current payload left the air
+        self.airtime = 0.0  # total seconds the radio was sending
+        self.sent = 0
+        self.delivered = 0  # receptions, every attached receiver counts once per payload
+        self.lost = 0
+
+    def attach(self, receiver) -> None:
+        # receiver: object with a receive(payload) method, like receiver.Receiver
+        self.receivers.append(receiver)
+
+    def payload_airtime(self) -> float:
+        return VirtualRadio.settling_seconds + (VirtualRadio.overhead_bits + 8 * VirtualRadio.payload_size) / self.data_rate
+
+    def write(self, buffer, multicast: bool = False) -> bool:
+        """
+        Broadcast a payload to the attached receivers.
+
+        Args:
+            buffer: Bytes-like payload of at most payload_size bytes.
+            multicast (bool): Accepted for compatibility with pyrf24, acknowledgements are never simulated.
+
+        Returns:
+            bool: False if the radio is powered down or the payload doesn't fit, otherwise True.
+        """
+        if not self.power or len(buffer) > VirtualRadio.payload_size:
+            return False
+
+        airtime = self.payload_airtime()
+        if self.realtime:
+            now = time.perf_counter()
+            if now < self.busy_until:
+                time.sleep(self.busy_until - now)
+            self.busy_until = max(now, self.busy_until) + airtime
+        self.airtime += airtime
+        self.sent += 1
+
+        payload = bytes(buffer).ljust(VirtualRadio.payload_size, b"\x00")
+        for receiver in self.receivers:
+            if self.loss > 0 and self.random.random() < self.loss:
+                self.lost += 1
+            else:
+                self.delivered += 1
+                receiver.receive(payload)
+        return True
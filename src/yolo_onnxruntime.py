@@ -1,8 +1,21 @@
 import onnxruntime
-from utils import draw_result, letterbox, xywh2xyxy, nms, scale_boxes
+from utils import draw_result, Letterbox, xywh2xyxy, nms, scale_boxes
 import os
 import numpy as np
 import cv2
+from metrics import metrics
+
+
+OPTIMIZATION_LEVELS = {
+    'DISABLE': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'BASIC': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'EXTENDED': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'ALL': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+EXECUTION_MODES = {
+    'SEQUENTIAL': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    'PARALLEL': onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
 
 
 '''
@@ -15,9 +28,17 @@ class YOLO_ONNXRuntime():
     param {str} device_type device type
     param {str} model_type  model type
     param {str} model_path  model path
+    param {int} intra_op_threads        threads used within one operator, 0 lets onnxruntime decide
+    param {int} inter_op_threads        threads used to run operators in parallel, 0 lets onnxruntime decide
+    param {str} optimization_level      graph optimization level: DISABLE, BASIC, EXTENDED or ALL
+    param {str} execution_mode          SEQUENTIAL or PARALLEL
+    param {bool} cache_optimized_model  write the optimized model next to the model on the first run and load it afterwards
+    param {bool} warmup                 run one inference at startup, so the first frame isn't slow
     return {*}
     '''    
-    def __init__(self, device_type:str, model_type:str, model_path:str, class_num:int, nms_threshold:float, confidence_threshold:float, inputs_shape:tuple[int, int]) -> None:
+    def __init__(self, device_type:str, model_type:str, model_path:str, class_num:int, nms_threshold:float, confidence_threshold:float, inputs_shape:tuple[int, int],
+                 intra_op_threads:int=0, inter_op_threads:int=0, optimization_level:str='ALL', execution_mode:str='SEQUENTIAL',
+                 cache_optimized_model:bool=False, warmup:bool=True) -> None:
         self.class_num = class_num
         self.nms_threshold = nms_threshold
         self.confidence_threshold = confidence_threshold
@@ -25,10 +46,27 @@ class YOLO_ONNXRuntime():
 
         assert os.path.exists(model_path), 'model not exists!'
         assert device_type in ['CPU', 'GPU'], 'unsupported device type!'
+        assert optimization_level in OPTIMIZATION_LEVELS, 'unsupported optimization level!'
+        assert execution_mode in EXECUTION_MODES, 'unsupported execution mode!'
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = intra_op_threads
+        session_options.inter_op_num_threads = inter_op_threads
+        session_options.graph_optimization_level = OPTIMIZATION_LEVELS[optimization_level]
+        session_options.execution_mode = EXECUTION_MODES[execution_mode]
+        if cache_optimized_model and optimization_level != 'DISABLE':
+            optimized_model_path = os.path.splitext(model_path)[0] + f'_{optimization_level.lower()}_{device_type.lower()}.onnx'
+            if os.path.exists(optimized_model_path) and os.path.getmtime(optimized_model_path) >= os.path.getmtime(model_path):
+                # the cached model is already optimized, don't optimize it again
+                model_path = optimized_model_path
+                session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+            else:
+                session_options.optimized_model_filepath = optimized_model_path
+
         if device_type == 'CPU':
-            self.onnx_session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+            self.onnx_session = onnxruntime.InferenceSession(model_path, session_options, providers=['CPUExecutionProvider'])
         elif device_type == 'GPU':
-            self.onnx_session = onnxruntime.InferenceSession(model_path, providers=['CUDAExecutionProvider'])
+            self.onnx_session = onnxruntime.InferenceSession(model_path, session_options, providers=['CUDAExecutionProvider'])
         self.model_type = model_type
          
         self.inputs_name = []
@@ -38,9 +76,40 @@ class YOLO_ONNXRuntime():
         for node in self.onnx_session.get_outputs():
             self.outputs_name.append(node.name)
         self.inputs = {}
-    
+
+        # Bind preallocated input and output buffers, so every inference reads and writes the same memory
+        input_dtype = np.float16 if model_type == 'FP16' else np.float32
+        self.input_buffer = np.zeros((1, 3, inputs_shape[0], inputs_shape[1]), dtype=input_dtype)
+        self.io_binding = self.onnx_session.io_binding()
+        self.input_value = onnxruntime.OrtValue.ortvalue_from_numpy(self.input_buffer)
+        for name in self.inputs_name:
+            self.inputs[name] = self.input_buffer
+            self.io_binding.bind_ortvalue_input(name, self.input_value)
+        self.output_buffers = []
+        for node in self.onnx_session.get_outputs():
+            if all(isinstance(dim, int) for dim in node.shape):
+                buffer = np.zeros(node.shape, dtype=np.float16 if node.type == 'tensor(float16)' else np.float32)
+                self.output_buffers.append(buffer)
+                self.io_binding.bind_ortvalue_output(node.name, onnxruntime.OrtValue.ortvalue_from_numpy(buffer))
+            else:
+                # dynamic output shape, let onnxruntime allocate the output
+                self.output_buffers = None
+                self.io_binding.bind_output(node.name, 'cpu')
+
+        if warmup:
+            self.process()
+
+    def set_input(self, input: np.ndarray) -> None:
+        # Copy the preprocessed image into the bound input buffer
+        np.copyto(self.input_buffer, input, casting='same_kind')
+
     def process(self) -> None:
-        self.outputs = self.onnx_session.run(None, self.inputs)
+        with metrics.timer("inference"):
+            self.onnx_session.run_with_iobinding(self.io_binding)
+        if self.output_buffers is not None:
+            self.outputs = self.output_buffers
+        else:
+            self.outputs = self.io_binding.copy_outputs_to_cpu()
 
 '''
 description: onnxruntime inference class for the YOLO classfiy algorithm
@@ -59,13 +128,7 @@ class YOLO_ONNXRuntime_Classify(YOLO_ONNXRuntime):
         input = input / 255.0
             
         input = input[:, :, ::-1].transpose(2, 0, 1)  #BGR2RGB and HWC2CHW
-        if self.model_type == 'FP32' or self.model_type == 'INT8':
-            input = np.expand_dims(input, axis=0).astype(dtype=np.float32)
-        elif self.model_type == 'FP16':
-            input = np.expand_dims(input, axis=0).astype(dtype=np.float16)
-            
-        for name in self.inputs_name:
-            self.inputs[name] = input
+        self.set_input(input)
             
     def post_process(self) -> None:
         output = np.squeeze(self.outputs).astype(dtype=np.float32)
@@ -76,59 +139,53 @@ class YOLO_ONNXRuntime_Classify(YOLO_ONNXRuntime):
 description: onnxruntime inference class for the YOLO detection algorithm
 '''
 class YOLO_ONNXRuntime_Detect(YOLO_ONNXRuntime):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.letterbox = Letterbox(self.inputs_shape, out=self.input_buffer)
+
     def pre_process(self, image) -> None:
-        input = letterbox(image, self.inputs_shape)
-        input = input[:, :, ::-1].transpose(2, 0, 1)  #BGR2RGB and HWC2CHW
-        input = input / 255.0
-        if self.model_type == 'FP32' or self.model_type == 'INT8':
-            input = np.expand_dims(input, axis=0).astype(dtype=np.float32)
-        elif self.model_type == 'FP16':
-            input = np.expand_dims(input, axis=0).astype(dtype=np.float16)
-        for name in self.inputs_name:
-            self.inputs[name] = input
+        # letterbox, BGR2RGB, HWC2CHW and normalization straight into the bound input buffer
+        with metrics.timer("preprocess"):
+            self.letterbox(image)
 
     def get_best_boxes(self, n: int, image: np.ndarray, write_image=False) -> np.ndarray:
+        with metrics.timer("postprocess"):
+            return self.select_best_boxes(n, image, write_image)
+
+    def select_best_boxes(self, n: int, image: np.ndarray, write_image=False) -> np.ndarray:
         output = np.squeeze(self.outputs[0]).astype(dtype=np.float32)
-        boxes = []
-        scores = []
-        class_ids = []
 
         output = output.T
         classes_scores = output[..., 4:(4 + self.class_num)]
-        
-        for i in range(output.shape[0]):       
-            class_id = np.argmax(classes_scores[i])
-            score = classes_scores[i][class_id]
-            if score > self.confidence_threshold:
-                boxes.append(np.concatenate([output[i, :4], np.array([score, class_id])]))
-                scores.append(score)
-                class_ids.append(class_id)
-
-        if len(boxes):   
-            boxes = np.array(boxes)
-            scores = np.array(scores)
 
+        # Only look for the best class of the candidates above the confidence threshold
+        scores = classes_scores.max(axis=1)
+        mask = scores > self.confidence_threshold
+        scores = scores[mask]
+
+        if len(scores):
+            boxes = np.empty((len(scores), 6))  # x, y, w, h, score, class_id
+            boxes[:, :4] = output[mask, :4]
+            boxes[:, 4] = scores
+            boxes[:, 5] = classes_scores[mask].argmax(axis=1)
             boxes = xywh2xyxy(boxes)
-            indices = nms(boxes, scores, self.nms_threshold) 
-            
-            boxes = boxes[indices]
-            scores = scores[indices]
-            class_ids = np.array(class_ids)[indices]
 
-            boxes = scale_boxes(boxes, self.inputs_shape, image.shape)
+            # The NMS only depends on boxes with a higher score, so it can stop at the n best kept boxes
+            indices = nms(boxes, scores, self.nms_threshold, limit=n)
 
-            if len(boxes) >= n:
-                top_indices = np.argsort(scores)[::-1][:n]  # Sort by descending confidence and get top n
-                boxes = boxes[top_indices]
-                scores = scores[top_indices]
-                class_ids = class_ids[top_indices]
+            if len(indices) >= n:
+                # The NMS returns the boxes sorted by descending confidence, so the first n are the top n
+                if self.letterbox.shape == image.shape[:2]:
+                    boxes = self.letterbox.scale_boxes(boxes[indices[:n]])
+                else:
+                    boxes = scale_boxes(boxes[indices[:n]], self.inputs_shape, image.shape)
 
                 if write_image:
                     self.result = draw_result(image, boxes)
                     cv2.imwrite("detected.jpeg", self.result)
                 return boxes
             else:
-                print(f"Not enough boxes found: {len(boxes)} compared to requested {n}")
+                print(f"Not enough boxes found: {len(indices)} compared to requested {n}")
         else:
             print(f"Wrong number of boxes found: {0} compared to requested {n}")
             